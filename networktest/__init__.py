@@ -1,6 +1,25 @@
-from .blocker import NetworkBlocker, NetworkBlockException
-from .testcase import NetworkBlockedTest, NetworkLimitedTest
+from ._lazy import lazy_module
+
+_LAZY_ATTRIBUTES = {
+    'EgressAuditor': '.audit',
+    'NetworkBlocker': '.blocker',
+    'NetworkBlockException': '.blocker',
+    'SimulatedSocket': '.simulated',
+    'NetworkBlockedTest': '.testcase',
+    'NetworkLimitedTest': '.testcase',
+    'NetworkBlockedClassTest': '.testcase',
+    'NetworkLimitedClassTest': '.testcase',
+    'NetworkBlockedAsyncTest': '.testcase',
+    'NetworkLimitedAsyncTest': '.testcase',
+    'NetworkUsage': '.usage',
+}
+
 __all__ = (
-    'NetworkBlocker', 'NetworkBlockException',
-    'NetworkBlockedTest', 'NetworkLimitedTest'
+    'EgressAuditor', 'NetworkBlocker', 'NetworkBlockException',
+    'SimulatedSocket', 'NetworkBlockedTest', 'NetworkLimitedTest',
+    'NetworkBlockedClassTest', 'NetworkLimitedClassTest',
+    'NetworkBlockedAsyncTest', 'NetworkLimitedAsyncTest', 'NetworkUsage'
 )
+
+
+__getattr__, __dir__ = lazy_module(__name__, _LAZY_ATTRIBUTES)
@@ -0,0 +1,36 @@
+import importlib
+import sys
+
+
+def lazy_module(name, attributes):
+    """
+        Submodules are only imported when one of their names is first
+          accessed so that loading the pytest plugin costs next to nothing
+          for test runs which never use networktest.
+
+        Args:
+            name (str): __name__ of the package.
+            attributes (dict): Module, relative to the package, by the name
+                of each attribute it provides.
+
+        Returns:
+            tuple: __getattr__ and __dir__ functions for the package.
+    """
+    namespace = sys.modules[name].__dict__
+
+    def __getattr__(attribute):
+        try:
+            module = attributes[attribute]
+        except KeyError:
+            raise AttributeError(
+                'module %r has no attribute %r' % (name, attribute)
+            ) from None
+
+        value = getattr(importlib.import_module(module, name), attribute)
+        namespace[attribute] = value
+        return value
+
+    def __dir__():
+        return sorted(set(namespace) | set(attributes))
+
+    return __getattr__, __dir__
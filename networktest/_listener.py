@@ -0,0 +1,69 @@
+import _socket
+import socket
+import threading
+
+
+class Listener:
+    """
+        Accepts connections on a socket in a daemon thread and handles each
+          one in a thread of its own.
+
+        Sockets are created with _socket directly so that neither the
+          listener nor the connections it accepts are affected by
+          :class:`NetworkBlocker` or by fakes patching socket.socket.
+
+        Attributes:
+          address: The address the listener is bound to.
+    """
+
+    def __init__(self, family, address, handler, name):
+        """
+            Args:
+                family (int): Address family of the socket.
+                address: Address to bind to.
+                handler (function): Called with the _socket.socket of each
+                    accepted connection. The handler closes it.
+                name (str): Name of the accepting thread.
+        """
+        self.__handler = handler
+        self.__closed = False
+        self.__socket = _socket.socket(family, socket.SOCK_STREAM)
+        if family != getattr(socket, 'AF_UNIX', None):
+            self.__socket.setsockopt(
+                socket.SOL_SOCKET, socket.SO_REUSEADDR, 1
+            )
+        self.__socket.bind(address)
+        self.__socket.listen(socket.SOMAXCONN)
+        # Periodically wake up to notice when the listener has been closed
+        self.__socket.settimeout(0.1)
+        self.address = self.__socket.getsockname()
+
+        self.__thread = threading.Thread(
+            target=self.__serve,
+            name=name,
+            daemon=True
+        )
+        self.__thread.start()
+
+    def close(self):
+        """
+            Stops accepting connections. Connections that were already
+              accepted are left to their handlers.
+        """
+        self.__closed = True
+        self.__thread.join()
+        self.__socket.close()
+
+    def __serve(self):
+        while not self.__closed:
+            try:
+                fd, _ = self.__socket._accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            threading.Thread(
+                target=self.__handler,
+                args=(_socket.socket(fileno=fd),),
+                daemon=True
+            ).start()
@@ -0,0 +1,333 @@
+import json
+import logging
+import random
+import socket
+import threading
+import time
+
+
+__all__ = ('EgressAuditor', 'AuditedSocket')
+
+
+logger = logging.getLogger('networktest.audit')
+
+# Key counts are attributed to once a limit on distinct keys is reached
+OVERFLOW = '<overflow>'
+
+
+class AuditedSocket(socket.socket):
+    """
+        socket.socket that reports the destinations it connects to to an
+          :class:`EgressAuditor`.
+    """
+
+    @classmethod
+    def wrap(cls, sock, auditor, call_site):
+        """
+            Returns an AuditedSocket that takes over the file descriptor of
+              sock.
+        """
+        audited = cls(sock.family, sock.type, sock.proto, sock.detach())
+        audited.auditor = auditor
+        audited.call_site = call_site
+        return audited
+
+    def connect(self, address):
+        self.auditor.record_destination(self.call_site, address)
+        return super().connect(address)
+
+    def connect_ex(self, address):
+        self.auditor.record_destination(self.call_site, address)
+        return super().connect_ex(address)
+
+    def sendto(self, data, *args):
+        self.auditor.record_destination(self.call_site, args[-1])
+        return super().sendto(data, *args)
+
+
+class EgressAuditor:
+    """
+        Aggregates the sockets created in :class:`NetworkBlocker` AUDIT mode
+          so that unexpected outbound connections of a long running service
+          can be found without the cost of WARNING mode.
+
+        Sockets are counted per call site, the first frame outside the
+          standard library and installed packages, and connections per call
+          site and destination. A stack is only captured for a sample of
+          sockets, at most once per call site per flush. New call sites are
+          logged to the networktest.audit logger at most max_log_rate times
+          a second. Once max_call_sites call sites have been logged the
+          next flush forgets them so that new ones are logged again.
+
+        A background thread writes one JSON record per call site every
+          flush_interval seconds to path, to handler, or to the
+          networktest.audit logger, and starts over. Memory is bounded by
+          max_call_sites and max_destinations; once they are reached counts
+          go to an '<overflow>' key.
+
+        Worst case overhead per socket is a walk of at most stack_limit
+          frames to find its call site, a random number, a locked dict
+          update, one more locked dict update for each connect or sendto,
+          and for sampled sockets a stack capture of stack_limit frames.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        handler=None,
+        flush_interval=60.0,
+        sample_rate=0.01,
+        stack_limit=32,
+        max_call_sites=1000,
+        max_destinations=100,
+        max_log_rate=1.0
+    ):
+        """
+            Args:
+                path (str): File that records are appended to as JSON lines.
+                handler (logging.Handler): Handler records are emitted to
+                    if path isn't set.
+                flush_interval (float): Seconds between writing records.
+                sample_rate (float): Probability of capturing the stack of
+                    a socket.
+                stack_limit (int): Maximum number of frames walked or
+                    captured per socket.
+                max_call_sites (int): Maximum number of distinct call sites
+                    kept between flushes.
+                max_destinations (int): Maximum number of distinct
+                    destinations kept per call site between flushes.
+                max_log_rate (float): Maximum number of new call sites
+                    logged per second.
+        """
+        self.path = path
+        self.handler = handler
+        self.flush_interval = flush_interval
+        self.sample_rate = sample_rate
+        self.stack_limit = stack_limit
+        self.max_call_sites = max_call_sites
+        self.max_destinations = max_destinations
+        self.max_log_rate = max_log_rate
+
+        self.__lock = threading.Lock()
+        self.__sockets = {}
+        self.__destinations = {}
+        self.__stacks = {}
+        self.__interval_start = time.time()
+        self.__library_code = {}
+        self.__call_sites = {}
+        self.__logged = set()
+        self.__log_window = None
+        self.__log_suppressed = 0
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        """
+            Starts the background thread that flushes records.
+        """
+        if self.__thread is None:
+            self.__stopped.clear()
+            self.__thread = threading.Thread(
+                target=self.__run,
+                name='networktest-audit',
+                daemon=True
+            )
+            self.__thread.start()
+
+    def stop(self):
+        """
+            Stops the background thread and flushes any remaining records.
+        """
+        if self.__thread is not None:
+            self.__stopped.set()
+            self.__thread.join()
+            self.__thread = None
+        self.flush()
+
+    def __run(self):
+        while not self.__stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to write network audit records')
+
+    def __is_library(self, code):
+        is_library = self.__library_code.get(code)
+        if is_library is None:
+            # The same heuristic WARNING mode uses to filter stacks
+            filename = code.co_filename
+            is_library = 'python' in filename or filename.startswith('<')
+            if len(self.__library_code) < self.max_call_sites * 10:
+                self.__library_code[code] = is_library
+        return is_library
+
+    def __get_call_site(self, frame):
+        caller = frame
+        for _ in range(self.stack_limit):
+            if frame is None:
+                break
+            if not self.__is_library(frame.f_code):
+                caller = frame
+                break
+            frame = frame.f_back
+        key = (caller.f_code, caller.f_lineno)
+        call_site = self.__call_sites.get(key)
+        if call_site is None:
+            code = caller.f_code
+            call_site = '%s:%d %s' % (
+                code.co_filename,
+                caller.f_lineno,
+                getattr(code, 'co_qualname', code.co_name)
+            )
+            if len(self.__call_sites) < self.max_call_sites:
+                self.__call_sites[key] = call_site
+        return call_site
+
+    def __should_log(self):
+        """
+            True if a new call site may be logged without exceeding
+              max_log_rate. Must be called while holding the lock.
+        """
+        if not self.max_log_rate:
+            return False
+        # One message is allowed per window of 1 / max_log_rate seconds
+        window = int(time.monotonic() * self.max_log_rate)
+        if window == self.__log_window:
+            self.__log_suppressed += 1
+            return False
+        self.__log_window = window
+        return True
+
+    def record_socket(self, frame):
+        """
+            Records a socket created by frame.
+
+            Returns:
+                str: The call site the socket was attributed to.
+        """
+        call_site = self.__get_call_site(frame)
+        sample = random.random() < self.sample_rate
+        if sample:
+            import traceback
+        log = False
+        with self.__lock:
+            if call_site not in self.__sockets and \
+                    len(self.__sockets) >= self.max_call_sites:
+                call_site = OVERFLOW
+            self.__sockets[call_site] = self.__sockets.get(call_site, 0) + 1
+            if call_site not in self.__logged and \
+                    len(self.__logged) < self.max_call_sites:
+                self.__logged.add(call_site)
+                log = self.__should_log()
+                if log:
+                    suppressed, self.__log_suppressed = \
+                        self.__log_suppressed, 0
+            if sample and call_site not in self.__stacks:
+                # Captured while holding the lock so the stack belongs to
+                #   the same flush as the socket. Source lines are only read
+                #   when records are collected.
+                stack = traceback.StackSummary.extract(
+                    traceback.walk_stack(frame),
+                    limit=self.stack_limit,
+                    lookup_lines=False
+                )
+                stack.reverse()
+                self.__stacks[call_site] = stack
+
+        # Logging handlers may create sockets themselves so nothing is
+        #   written while holding the lock
+        if log:
+            logger.warning(
+                'Unexpected network connection from %s%s', call_site,
+                ' (%d more suppressed)' % suppressed if suppressed else ''
+            )
+        return call_site
+
+    def record_destination(self, call_site, address):
+        """
+            Records a connection from call_site to address.
+        """
+        if isinstance(address, tuple):
+            destination = '%s:%s' % address[:2]
+        else:
+            destination = str(address)
+        with self.__lock:
+            destinations = self.__destinations.get(call_site)
+            if destinations is None and \
+                    len(self.__destinations) >= self.max_call_sites:
+                call_site = OVERFLOW
+                destinations = self.__destinations.get(call_site)
+            if destinations is None:
+                destinations = self.__destinations[call_site] = {}
+            if destination not in destinations and \
+                    len(destinations) >= self.max_destinations:
+                destination = OVERFLOW
+            destinations[destination] = destinations.get(destination, 0) + 1
+
+    def wrap(self, sock, frame):
+        """
+            Records a socket created by frame.
+
+            Returns:
+                AuditedSocket: A socket that takes over sock and records
+                  where it connects to.
+        """
+        return AuditedSocket.wrap(sock, self, self.record_socket(frame))
+
+    def collect(self):
+        """
+            Returns the records aggregated since the last collection and
+              starts over.
+
+            Returns:
+                list of dicts: One record per call site.
+        """
+        now = time.time()
+        with self.__lock:
+            sockets, self.__sockets = self.__sockets, {}
+            destinations, self.__destinations = self.__destinations, {}
+            stacks, self.__stacks = self.__stacks, {}
+            start, self.__interval_start = self.__interval_start, now
+            if len(self.__logged) >= self.max_call_sites:
+                self.__logged = set()
+
+        if stacks:
+            import traceback
+
+        records = []
+        for call_site in sorted(set(sockets) | set(destinations)):
+            record = {
+                'start': start,
+                'end': now,
+                'call_site': call_site,
+                'sockets': sockets.get(call_site, 0),
+                'destinations': destinations.get(call_site, {}),
+            }
+            if call_site in stacks:
+                record['stack'] = traceback.format_list(stacks[call_site])
+            records.append(record)
+        return records
+
+    def flush(self):
+        """
+            Writes the records aggregated since the last flush.
+        """
+        records = self.collect()
+        if not records:
+            return
+
+        lines = [json.dumps(record, sort_keys=True) for record in records]
+        if self.path:
+            with open(self.path, 'a') as audit_file:
+                audit_file.write(''.join(line + '\n' for line in lines))
+            return
+        for line in lines:
+            if self.handler is not None:
+                self.handler.handle(logging.makeLogRecord({
+                    'name': logger.name,
+                    'msg': line,
+                    'levelno': logging.INFO,
+                    'levelname': 'INFO',
+                }))
+            else:
+                logger.info(line)
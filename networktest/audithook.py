@@ -0,0 +1,80 @@
+import sys
+import threading
+
+
+__all__ = ('AuditHook',)
+
+
+# Blockers using the AUDIT_HOOK backend, innermost last. The hook can't be
+#   removed once added and is called for every audit event in the process
+#   so it returns as early as possible.
+_blockers = []
+_events = frozenset((
+    'socket.connect',
+    'socket.getaddrinfo',
+    'socket.sendto',
+    'socket.sendmsg',
+))
+
+
+class _Local(threading.local):
+    # A class default is much cheaper to look up than a missing attribute
+    handling = False
+
+
+_local = _Local()
+
+
+def _hook(event, args):
+    if event not in _events or not _blockers:
+        return
+    if _local.handling:
+        # eg. a warning or an audit record which opens a socket itself
+        return
+
+    frame = sys._getframe(1)
+    _local.handling = True
+    try:
+        for blocker in reversed(_blockers):
+            blocker.handle_audit_event(event, args, frame)
+    finally:
+        _local.handling = False
+
+
+class AuditHook:
+    """
+        Lets :class:`NetworkBlocker` see network activity through
+          sys.addaudithook instead of by replacing socket.socket.
+
+        Audit events are raised by the socket module itself so this also
+          covers sockets created through a reference to socket.socket taken
+          before a blocker was entered, through _socket, and by C
+          extensions using the socket module. A single hook is added the
+          first time a blocker registers and stays for the life of the
+          process. It is called for every audit event raised in the process,
+          such as open, import and exec, and returns after a set lookup for
+          anything other than the socket events it checks.
+    """
+
+    __installed = False
+    __lock = threading.Lock()
+
+    @classmethod
+    def register(cls, blocker):
+        """
+            Starts passing network audit events to blocker.
+        """
+        with cls.__lock:
+            if not cls.__installed:
+                sys.addaudithook(_hook)
+                cls.__installed = True
+            _blockers.append(blocker)
+
+    @classmethod
+    def unregister(cls, blocker):
+        """
+            Stops passing network audit events to blocker.
+        """
+        with cls.__lock:
+            if blocker in _blockers:
+                _blockers.remove(blocker)
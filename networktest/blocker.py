@@ -1,9 +1,15 @@
+import _socket
+import errno
+import os
 import sys
-import traceback
 import socket
+import warnings
 from enum import Enum, auto
 
+from .matcher import CallSiteMatcher
 from .pytest.integration import PytestIntegration
+from .simulated import SimulatedSocket
+from .usage import AccountedSocket
 
 
 class NetworkBlockException(Exception):
@@ -27,8 +33,18 @@ class NetworkBlocker:
 
         STRICT = auto()
         WARNING = auto()
+        SIMULATE = auto()
+        AUDIT = auto()
         DISABLED = auto()
 
+    class Backends(Enum):
+        """
+            How NetworkBlocker intercepts network requests
+        """
+
+        PATCH = auto()
+        AUDIT_HOOK = auto()
+
     class AllowablePackages:
         """
             Lists of packages that may be permitted to make requests in
@@ -40,11 +56,21 @@ class NetworkBlocker:
             'celery'
         ]
 
+    __active = False
+    __patched = None
+    __auditing = None
+
     def __init__(
         self,
         mode: auto = None,
         allowed_packages=None,
-        filter_stack: bool = True
+        filter_stack: bool = True,
+        allowed_modules=None,
+        denied_modules=None,
+        simulate_errno: int = errno.ECONNREFUSED,
+        usage=None,
+        auditor=None,
+        backend: auto = None
     ):
         """
             A context manager that prevents network requests while active.
@@ -54,6 +80,13 @@ class NetworkBlocker:
                 NetworkBlockException when any network requests are attempted
             * NetworkBlocker.Modes.WARNING - Log a warning when any network
                 requests are attempted
+            * NetworkBlocker.Modes.SIMULATE - Log a warning when any network
+                requests are attempted and hand back a SimulatedSocket
+                instead of a real socket. No file descriptor is allocated
+                and no connection is attempted.
+            * NetworkBlocker.Modes.AUDIT - Allow all network requests but
+                aggregate the ones that would have been blocked into an
+                EgressAuditor. Cheap enough to run in long running services.
             * NetworkBlocker.Modes.DISABLED - Do nothing. This is mainly
                 useful if you want to temporarily disable NetworkBlocker
                 without removing it.
@@ -71,22 +104,138 @@ class NetworkBlocker:
                 filter_stack (bool): Whether or not to filter out libraries
                     from the call stack in WARNING mode so it's easier to see
                     exactly where in application a request is made.
+                allowed_modules (list of strings): Dotted module or qualified
+                    function globs (eg. 'myapp.cache.*') that are allowed to
+                    make network requests.
+                denied_modules (list of strings): Dotted module or qualified
+                    function globs that may not make network requests even
+                    if code further up the call stack is allowed.
+                simulate_errno (int): errno raised when a SimulatedSocket
+                    connects in SIMULATE mode. Set to None to let the
+                    connection succeed and silently discard all traffic.
+                usage (NetworkUsage): If provided, real sockets handed out
+                    while active record the connections they make, the bytes
+                    they transfer and the time spent blocked on I/O here.
+                auditor (EgressAuditor): Records sockets in AUDIT mode.
+                    Defaults to an EgressAuditor logging to the
+                    networktest.audit logger every minute.
+                backend (enum.auto): NetworkBlocker.Backends.PATCH (default)
+                    replaces socket.socket while active.
+                    NetworkBlocker.Backends.AUDIT_HOOK instead checks
+                    connections, datagrams and DNS lookups of remote hosts
+                    through a sys.addaudithook hook. This also catches
+                    sockets which weren't created through socket.socket
+                    but usage only counts connections and
+                    SIMULATE mode makes connections fail with
+                    simulate_errno (or succeed if it is None) instead of
+                    handing back a SimulatedSocket.
         """
 
+        self.usage = usage
+        self.auditor = None
+        # Sockets the rules blocked (or only warned about) and allowed
+        self.violations = 0
+        self.allowed = 0
+        self.__set_policy(
+            mode, allowed_packages, filter_stack, allowed_modules,
+            denied_modules, simulate_errno, auditor, backend
+        )
+
+    def __set_policy(self, mode, allowed_packages, filter_stack,
+                     allowed_modules, denied_modules, simulate_errno,
+                     auditor, backend):
         self.mode = self.Modes.STRICT if mode is None else mode
         self.allowed_packages = [] if allowed_packages is None \
             else allowed_packages
         self.filter_stack = filter_stack
+        self.allowed_modules = [] if allowed_modules is None \
+            else allowed_modules
+        self.denied_modules = [] if denied_modules is None \
+            else denied_modules
+        self.simulate_errno = simulate_errno
+        if auditor is not None:
+            self.auditor = auditor
+        elif self.auditor is None and self.mode == self.Modes.AUDIT:
+            from .audit import EgressAuditor
+            self.auditor = EgressAuditor()
+        self.backend = self.Backends.PATCH if backend is None else backend
+
+    def configure(
+        self,
+        mode: auto = None,
+        allowed_packages=None,
+        filter_stack: bool = True,
+        allowed_modules=None,
+        denied_modules=None,
+        simulate_errno: int = errno.ECONNREFUSED,
+        usage=None,
+        auditor=None,
+        backend: auto = None
+    ):
+        """
+            Replaces the policy of this blocker with the one
+              NetworkBlocker(**kwargs) would have, even while it is active.
+              Unlike entering a new blocker socket.socket is only patched
+              again if the mode switches to or from DISABLED or the backend
+              changes.
+
+            usage and auditor are only replaced if new ones are given and
+              violations and allowed keep counting.
+        """
+        if usage is not None:
+            self.usage = usage
+        self.__set_policy(
+            mode, allowed_packages, filter_stack, allowed_modules,
+            denied_modules, simulate_errno, auditor, backend
+        )
+        if self.__active:
+            self.__apply()
+
+    def __apply(self):
+        """
+            Patches or restores socket.socket and starts or stops the
+              auditor to match the mode and whether the blocker is active.
+        """
+        if self.__active:
+            self.matcher = CallSiteMatcher.for_rules(
+                self.allowed_modules,
+                self.denied_modules,
+                self.allowed_packages
+            )
+
+        patch = self.backend if self.__active and \
+            self.mode != self.Modes.DISABLED else None
+        if patch != self.__patched:
+            if self.__patched == self.Backends.PATCH:
+                socket.socket = self.original_socket
+            elif self.__patched == self.Backends.AUDIT_HOOK:
+                from .audithook import AuditHook
+                AuditHook.unregister(self)
+
+            if patch == self.Backends.PATCH:
+                socket.socket = self.replacement_socket
+            elif patch == self.Backends.AUDIT_HOOK:
+                from .audithook import AuditHook
+                AuditHook.register(self)
+            self.__patched = patch
+
+        auditor = self.auditor if self.__active and \
+            self.mode == self.Modes.AUDIT else None
+        if self.__auditing is not auditor:
+            if self.__auditing is not None:
+                self.__auditing.stop()
+            if auditor is not None:
+                auditor.start()
+            self.__auditing = auditor
 
     def __enter__(self):
         self.original_socket = socket.socket
-
-        if self.mode != self.Modes.DISABLED:
-            socket.socket = self.replacement_socket
+        self.__active = True
+        self.__apply()
 
     def __exit__(self, type, value, traceback):
-        if self.mode != self.Modes.DISABLED:
-            socket.socket = self.original_socket
+        self.__active = False
+        self.__apply()
 
     def stack_allowed(self, stack) -> bool:
         """
@@ -94,7 +243,17 @@ class NetworkBlocker:
                 network requests.
             This is determined by checking the packages used
                 against allowed_packages.
+
+            Deprecated: allowed_modules and denied_modules are ignored. Use
+                matcher.frame_allowed, which applies every rule to a frame.
         """
+        warnings.warn(
+            'NetworkBlocker.stack_allowed is deprecated and ignores '
+            'allowed_modules and denied_modules; use '
+            'NetworkBlocker.matcher.frame_allowed instead.',
+            DeprecationWarning,
+            stacklevel=2
+        )
         return any(
             any(
                 '/%s/' % package in frame.filename and
@@ -106,39 +265,145 @@ class NetworkBlocker:
             for frame in stack
         )
 
-    def replacement_socket(self, *args, **kwargs):
+    def print_warning(self, stack):
+        """
+            Prints a warning about a blocked network request to stderr
+              while temporarily disabling pytest's output capturing.
+        """
+        import traceback
+
+        stop_capture = PytestIntegration.capman and \
+            PytestIntegration.capman.is_globally_capturing()
+        if stop_capture:
+            PytestIntegration.capman.suspend_global_capture()
+
+        print(file=sys.stderr)
+        print('A test that should not be doing so opened ' +
+              'a network connection.', file=sys.stderr)
+        print('This was most likely an API request.', file=sys.stderr)
+        print('It happened here:', file=sys.stderr)
+
+        if self.filter_stack:
+            # Ideally this uses a full path (eg. /usr/lib/pythonx.x)
+            #   but how can we get that reliably without
+            #   making assumptions?
+            stack = filter(
+                lambda frame: 'python' not in frame.filename,
+                stack
+            )
+        for st in traceback.format_list(stack):
+            print(st, end='', file=sys.stderr)
+
+        if stop_capture:
+            PytestIntegration.capman.resume_global_capture()
 
-        stack = traceback.extract_stack()
-        if not self.stack_allowed(stack):
+    def replacement_socket(self, *args, **kwargs):
+        frame = sys._getframe(1)
+        if self.mode in (self.Modes.SIMULATE, self.Modes.AUDIT) and \
+                _get_fileno(args, kwargs) is not None:
+            # socketpair, accept, dup and fromfd wrap a socket which already
+            #   exists so there is nothing to simulate and no egress to audit
+            pass
+        elif not self.matcher.frame_allowed(frame):
+            self.violations += 1
             if self.mode == self.Modes.STRICT:
                 raise NetworkBlockException()
-            elif self.mode == self.Modes.WARNING:
-                stop_capture = PytestIntegration.capman and \
-                    PytestIntegration.capman.is_globally_capturing()
-                if stop_capture:
-                    PytestIntegration.capman.suspend_global_capture()
-
-                print(file=sys.stderr)
-                print('A test that should not be doing so opened ' +
-                      'a network connection.', file=sys.stderr)
-                print('This was most likely an API request.', file=sys.stderr)
-                print('It happened here:', file=sys.stderr)
-
-                if self.filter_stack:
-                    # Ideally this uses a full path (eg. /usr/lib/pythonx.x)
-                    #   but how can we get that reliably without
-                    #   making assumptions?
-                    stack = filter(
-                        lambda frame: 'python' not in frame.filename,
-                        stack
-                    )
-                for st in traceback.format_list(stack):
-                    print(st, end='', file=sys.stderr)
-
-                if stop_capture:
-                    PytestIntegration.capman.resume_global_capture()
-
-        return self.original_socket(*args, **kwargs)
+            if self.mode == self.Modes.AUDIT:
+                return self.auditor.wrap(
+                    self.original_socket(*args, **kwargs), frame
+                )
+
+            import traceback
+            stack = traceback.extract_stack(frame)
+            if self.mode == self.Modes.WARNING:
+                self.print_warning(stack)
+            elif self.mode == self.Modes.SIMULATE:
+                self.print_warning(stack)
+                return SimulatedSocket(
+                    *args, connect_errno=self.simulate_errno, **kwargs
+                )
+
+        else:
+            self.allowed += 1
+
+        sock = self.original_socket(*args, **kwargs)
+        if self.usage is not None and not isinstance(sock, SimulatedSocket):
+            sock = AccountedSocket.wrap(sock, self.usage)
+        return sock
+
+    def handle_audit_event(self, event, args, frame):
+        """
+            Applies this blocker's policy to a network audit event raised
+              by frame while using the AUDIT_HOOK backend.
+        """
+        if event == 'socket.getaddrinfo':
+            # Only worth stopping when a connection will fail anyway
+            if self.mode not in (self.Modes.STRICT, self.Modes.SIMULATE) \
+                    or _is_local_host(args[0]):
+                return
+            address = args[:2]
+        else:
+            address = args[1]
+            if address is None or isinstance(address, (str, bytes)):
+                # Already connected or an AF_UNIX path, local to this
+                #   machine. Checking the address is much cheaper than
+                #   socket.family.
+                return
+
+        if self.matcher.frame_allowed(frame):
+            if event == 'socket.connect':
+                self.allowed += 1
+                if self.usage is not None:
+                    self.usage.connections += 1
+            return
+
+        self.violations += 1
+        if self.mode == self.Modes.STRICT:
+            raise NetworkBlockException()
+        if self.mode == self.Modes.AUDIT:
+            self.auditor.record_destination(
+                self.auditor.record_socket(frame), address
+            )
+            return
+
+        import traceback
+        self.print_warning(traceback.extract_stack(frame))
+        if self.mode == self.Modes.SIMULATE and \
+                self.simulate_errno is not None:
+            raise OSError(
+                self.simulate_errno, os.strerror(self.simulate_errno)
+            )
+
+
+def _get_fileno(args, kwargs):
+    """
+        Returns:
+            int: The file descriptor passed to socket.socket or None if the
+              socket is new.
+    """
+    if len(args) > 3:
+        return args[3]
+    return kwargs.get('fileno')
+
+
+def _is_local_host(host):
+    """
+        True if looking up host doesn't need a DNS server.
+    """
+    if host is None:
+        return True
+    if isinstance(host, bytes):
+        host = host.decode(errors='replace')
+    host = host.lower().rstrip('.')
+    if host == 'localhost' or host.endswith('.localhost'):
+        return True
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            _socket.inet_pton(family, host.split('%')[0])
+            return True
+        except OSError:
+            pass
+    return False
 
 
 PRESET_KWARGS_BLOCKED = {
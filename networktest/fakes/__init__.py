@@ -0,0 +1,13 @@
+from .._lazy import lazy_module
+
+_LAZY_ATTRIBUTES = {
+    'FakeConnection': '.base',
+    'FakeServer': '.base',
+    'FakeServerSocket': '.base',
+    'FakeRedis': '.redis',
+}
+
+__all__ = ('FakeConnection', 'FakeServer', 'FakeServerSocket', 'FakeRedis')
+
+
+__getattr__, __dir__ = lazy_module(__name__, _LAZY_ATTRIBUTES)
@@ -0,0 +1,308 @@
+import _socket
+import errno
+import socket
+import threading
+from enum import Enum, auto
+
+from .._listener import Listener
+
+
+__all__ = ('FakeConnection', 'FakeServer', 'FakeServerSocket')
+
+
+def _get_socket_class():
+    """
+        Returns:
+            type: socket.socket, even if it has been replaced, eg. by an
+              active NetworkBlocker, by the time this module is imported.
+    """
+    if isinstance(socket.socket, type):
+        return socket.socket
+    return next(
+        cls for cls in _socket.socket.__subclasses__()
+        if cls.__module__ == 'socket' and cls.__name__ == 'socket'
+    )
+
+
+class FakeServerSocket(_get_socket_class()):
+    """
+        socket.socket handed out while an in-process :class:`FakeServer` is
+          active. Connections to the address of an active fake are served
+          by the fake in memory. Any other connection behaves like a normal
+          socket.
+
+        The socket keeps its own file descriptor so options and timeouts
+          set before connecting work as usual, but nothing is ever sent on
+          it once it is connected to a fake.
+    """
+
+    _fake_connection = None
+    _fake_address = None
+
+    @classmethod
+    def wrap(cls, sock):
+        """
+            Returns a FakeServerSocket that takes over the file descriptor of
+              sock.
+        """
+        return cls(sock.family, sock.type, sock.proto, sock.detach())
+
+    def __connect_fake(self, address):
+        server = FakeServer._get_in_process(address)
+        if server is None:
+            return False
+        self._fake_connection = server.connection()
+        self._fake_address = address
+        self._fake_buffer = bytearray()
+        return True
+
+    def connect(self, address):
+        if not self.__connect_fake(address):
+            return super().connect(address)
+
+    def connect_ex(self, address):
+        if not self.__connect_fake(address):
+            return super().connect_ex(address)
+        return 0
+
+    def getpeername(self):
+        if self._fake_connection is None:
+            return super().getpeername()
+        return self._fake_address
+
+    def send(self, data, *args):
+        if self._fake_connection is None:
+            return super().send(data, *args)
+        self._fake_buffer += self._fake_connection.data_received(
+            bytes(data)
+        )
+        return memoryview(data).nbytes
+
+    def sendall(self, data, *args):
+        if self._fake_connection is None:
+            return super().sendall(data, *args)
+        self.send(data)
+
+    def __read(self, size):
+        if not self._fake_buffer:
+            if self._fake_connection.closed:
+                return b''
+            # Responses are produced as soon as a request is sent so
+            #   waiting wouldn't make any more arrive
+            if self.gettimeout() == 0:
+                raise BlockingIOError(
+                    errno.EAGAIN, 'Resource temporarily unavailable'
+                )
+            raise socket.timeout('timed out')
+        data = bytes(self._fake_buffer[:size or len(self._fake_buffer)])
+        del self._fake_buffer[:len(data)]
+        return data
+
+    def recv(self, size, *args):
+        if self._fake_connection is None:
+            return super().recv(size, *args)
+        return self.__read(size)
+
+    def recv_into(self, buffer, size=0, *args):
+        if self._fake_connection is None:
+            return super().recv_into(buffer, size, *args)
+        view = memoryview(buffer).cast('B')
+        data = self.__read(size or len(view))
+        view[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if self._fake_connection is not None:
+            self._fake_connection.close()
+        super().close()
+
+
+class FakeConnection:
+    """
+        The protocol state of a single client connection to a
+          :class:`FakeServer`.
+
+        Attributes:
+          closed (bool): Whether the connection has been closed by either
+            side.
+    """
+
+    def __init__(self):
+        self.closed = False
+
+    def data_received(self, data):
+        """
+            Called with the bytes a client sends, which may hold any part of
+              one or more requests.
+
+            Returns:
+                bytes: The bytes to respond with.
+        """
+        return b''
+
+    def close(self):
+        self.closed = True
+
+
+class FakeServer:
+    """
+        Base class for in-memory fakes of network services which serve a
+          protocol over one of two transports:
+
+        * FakeServer.Transports.IN_PROCESS (default) - Sockets connecting to
+            host and port are served in memory without touching the network.
+            socket.socket is patched while the fake is running.
+        * FakeServer.Transports.LOOPBACK - A thread serves real connections
+            on a loopback port, for clients which can't be patched such as
+            other processes. address is the (host, port) to connect to.
+
+        Subclasses implement a protocol by overriding connection to return
+          a :class:`FakeConnection` subclass.
+
+        Attributes:
+          host (str): Host clients connect to. Connections to any address it
+            resolves to are served in IN_PROCESS mode.
+          port (int): Port clients connect to. A free port is picked when
+            None in LOOPBACK mode.
+          address (tuple): (host, port) clients should connect to once the
+            fake has been started.
+    """
+
+    class Transports(Enum):
+        IN_PROCESS = auto()
+        LOOPBACK = auto()
+
+    default_port = None
+
+    __in_process = {}
+    __original_socket = None
+    __lock = threading.RLock()
+
+    def __init__(self, transport=None, host='localhost', port=None):
+        if transport is None:
+            transport = self.Transports.IN_PROCESS
+        self.transport = transport
+        self.host = host
+        self.port = self.default_port if port is None else port
+        self.address = None
+        self.__addresses = None
+        self.__listener = None
+
+    def connection(self):
+        """
+            A method that is called for every new connection to the fake.
+            By default connections accept anything and never respond.
+
+            Returns:
+                FakeConnection: The protocol state of the new connection.
+        """
+        return FakeConnection()
+
+    def reset(self):
+        """
+            Forgets all data held by the fake.
+        """
+
+    @classmethod
+    def _get_in_process(cls, address):
+        """
+            Returns:
+                FakeServer: The running in-process fake serving address or
+                  None.
+        """
+        if not isinstance(address, tuple):
+            return None
+        return cls.__in_process.get(tuple(address[:2]))
+
+    def __resolve(self):
+        addresses = {(self.host, self.port)}
+        try:
+            for *_, sockaddr in socket.getaddrinfo(
+                self.host, self.port, type=socket.SOCK_STREAM
+            ):
+                addresses.add(tuple(sockaddr[:2]))
+        except socket.gaierror:
+            pass
+        return tuple(addresses)
+
+    def __start_in_process(self):
+        if self.__addresses is None:
+            self.__addresses = self.__resolve()
+        with self.__lock:
+            in_process = FakeServer.__in_process
+            for address in self.__addresses:
+                if address in in_process:
+                    raise ValueError(
+                        'A fake is already serving %s:%s' % address
+                    )
+            if not in_process:
+                FakeServer.__original_socket = socket.socket
+                socket.socket = FakeServer.__replacement_socket
+            for address in self.__addresses:
+                in_process[address] = self
+        self.address = (self.host, self.port)
+
+    def __stop_in_process(self):
+        with self.__lock:
+            in_process = FakeServer.__in_process
+            for address in self.__addresses:
+                in_process.pop(address, None)
+            if not in_process and FakeServer.__original_socket is not None:
+                socket.socket = FakeServer.__original_socket
+                FakeServer.__original_socket = None
+
+    @staticmethod
+    def __replacement_socket(*args, **kwargs):
+        sock = FakeServer.__original_socket(*args, **kwargs)
+        if not isinstance(sock, _socket.socket):
+            # eg. a SimulatedSocket which never connects anywhere
+            return sock
+        return FakeServerSocket.wrap(sock)
+
+    def __start_loopback(self):
+        self.__listener = Listener(
+            socket.AF_INET,
+            ('127.0.0.1', self.port or 0),
+            self.__handle,
+            name='networktest-%s' % type(self).__name__
+        )
+        self.address = self.__listener.address
+
+    def __stop_loopback(self):
+        self.__listener.close()
+        self.__listener = None
+
+    def __handle(self, sock):
+        connection = self.connection()
+        try:
+            while not connection.closed:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                response = connection.data_received(data)
+                if response:
+                    sock.sendall(response)
+        except OSError:
+            pass
+        finally:
+            connection.close()
+            sock.close()
+
+    def start(self):
+        if self.transport == self.Transports.LOOPBACK:
+            self.__start_loopback()
+        else:
+            self.__start_in_process()
+        return self
+
+    def stop(self):
+        if self.transport == self.Transports.LOOPBACK:
+            self.__stop_loopback()
+        else:
+            self.__stop_in_process()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
@@ -0,0 +1,737 @@
+import fnmatch
+import inspect
+import threading
+import time
+
+from .base import FakeConnection, FakeServer
+
+
+__all__ = ('FakeRedis', 'RedisError')
+
+
+class RedisError(Exception):
+    """
+        An error returned to the client as a RESP error reply.
+    """
+
+
+WRONGTYPE = \
+    'WRONGTYPE Operation against a key holding the wrong kind of value'
+NOT_INTEGER = 'ERR value is not an integer or out of range'
+NOT_FLOAT = 'ERR value is not a valid float'
+SYNTAX = 'ERR syntax error'
+
+
+def wrong_arguments(name):
+    return RedisError(
+        'ERR wrong number of arguments for \'%s\' command' % name
+    )
+
+
+def encode(value, protocol=2):
+    """
+        Returns:
+            bytes: value as a RESP2 or RESP3 reply. Dicts are sent as maps
+              and Members as sets in RESP3 and both as arrays in RESP2.
+    """
+    if value is None:
+        return b'_\r\n' if protocol == 3 else b'$-1\r\n'
+    if isinstance(value, RedisError):
+        return b'-%s\r\n' % str(value).encode()
+    if isinstance(value, bool):
+        return b':%d\r\n' % value
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, Status):
+        return b'+%s\r\n' % value
+    if isinstance(value, str):
+        value = value.encode()
+    if isinstance(value, (bytes, bytearray)):
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+    if isinstance(value, dict):
+        if protocol == 3:
+            return b'%%%d\r\n' % len(value) + b''.join(
+                encode(key, protocol) + encode(item, protocol)
+                for key, item in value.items()
+            )
+        value = [item for pair in value.items() for item in pair]
+    prefix = b'~' if protocol == 3 and isinstance(value, Members) else b'*'
+    return prefix + b'%d\r\n' % len(value) + b''.join(
+        encode(item, protocol) for item in value
+    )
+
+
+class Status(bytes):
+    """
+        A RESP simple string reply.
+    """
+
+
+class Members(list):
+    """
+        The members of a set, sent as a RESP3 set reply.
+    """
+
+
+OK = Status(b'OK')
+QUEUED = Status(b'QUEUED')
+
+
+class RespParser:
+    """
+        Incrementally parses RESP commands, and inline commands as sent by
+          telnet, from the bytes a client sends.
+    """
+
+    def __init__(self):
+        self.__buffer = bytearray()
+
+    def feed(self, data):
+        """
+            Returns:
+                list: The commands, each a list of bytes, completed by data.
+                  Empty commands are skipped like Redis does.
+        """
+        self.__buffer += data
+        commands = []
+        while True:
+            command = self.__parse()
+            if command is None:
+                return commands
+            if command:
+                commands.append(command)
+
+    def __parse(self):
+        buffer = self.__buffer
+        end = buffer.find(b'\r\n')
+        if end == -1:
+            return None
+
+        if buffer[:1] != b'*':
+            command = bytes(buffer[:end]).split()
+            del buffer[:end + 2]
+            return command
+
+        count = int(buffer[1:end])
+        position = end + 2
+        command = []
+        for _ in range(count):
+            end = buffer.find(b'\r\n', position)
+            if end == -1 or buffer[position:position + 1] != b'$':
+                return None
+            length = int(buffer[position + 1:end])
+            start = end + 2
+            if len(buffer) < start + length + 2:
+                return None
+            command.append(bytes(buffer[start:start + length]))
+            position = start + length + 2
+        del buffer[:position]
+        return command
+
+
+class RedisConnection(FakeConnection):
+    """
+        The state of a single client connection to :class:`FakeRedis`.
+
+        Attributes:
+          protocol (int): RESP version of replies, switched by HELLO.
+    """
+
+    def __init__(self, server):
+        super().__init__()
+        self.server = server
+        self.db = 0
+        self.protocol = 2
+        self.transaction = None
+        self.__parser = RespParser()
+
+    def data_received(self, data):
+        return b''.join(
+            encode(self.server.execute(self, command), self.protocol)
+            for command in self.__parser.feed(data)
+        )
+
+
+def _int(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise RedisError(NOT_INTEGER) from None
+
+
+def _float(value):
+    try:
+        return float(value)
+    except ValueError:
+        raise RedisError(NOT_FLOAT) from None
+
+
+def _number(value):
+    if isinstance(value, float):
+        value = b'%.17g' % value
+        if b'.' in value and b'e' not in value:
+            value = value.rstrip(b'0').rstrip(b'.')
+        return value
+    return str(value).encode()
+
+
+class FakeRedis(FakeServer):
+    """
+        An in-memory fake of a Redis server which speaks RESP2, and RESP3
+          once a client switches with HELLO, so that unmodified clients such
+          as redis-py can be used in tests without a running server.
+
+        Strings, hashes, lists, sets, expiry, multiple databases and
+          MULTI/EXEC transactions are supported. Unsupported commands
+          return an error. Each connection's commands are executed one at
+          a time against data shared by all connections.
+
+        reset forgets all data without any round trip, which is much cheaper
+          than FLUSHALL between tests.
+
+        Attributes:
+          databases (int): Number of databases that may be selected.
+    """
+
+    default_port = 6379
+    databases = 16
+
+    __arities = {}
+
+    def __init__(self, transport=None, host='localhost', port=None):
+        super().__init__(transport, host, port)
+        self.__lock = threading.Lock()
+        self.reset()
+
+    def connection(self):
+        return RedisConnection(self)
+
+    def reset(self):
+        self.__data = [{} for _ in range(self.databases)]
+        self.__expires = [{} for _ in range(self.databases)]
+
+    def execute(self, connection, command):
+        """
+            Executes a command, given as a list of bytes, for connection.
+
+            Returns:
+                The reply to the command.
+        """
+        name = command[0].decode(errors='replace').lower()
+        if connection.transaction is not None and \
+                name not in ('exec', 'discard', 'multi', 'watch'):
+            try:
+                self.__get_handler(name, command)
+            except RedisError as e:
+                connection.transaction = None
+                return e
+            connection.transaction.append(command)
+            return QUEUED
+        with self.__lock:
+            return self.__execute(connection, command)
+
+    def __get_handler(self, name, command):
+        """
+            Returns:
+                function: The handler of a command after checking that it
+                  exists and was given as many arguments as it takes.
+        """
+        handler = getattr(self, '_cmd_' + name, None)
+        if handler is None:
+            raise RedisError('ERR unknown command \'%s\'' % name)
+
+        arity = self.__arities.get(handler.__func__)
+        if arity is None:
+            code = handler.__code__
+            # Not counting self and connection
+            positional = code.co_argcount - 2
+            arity = self.__arities[handler.__func__] = (
+                positional - len(handler.__defaults__ or ()),
+                None if code.co_flags & inspect.CO_VARARGS else positional
+            )
+        minimum, maximum = arity
+        arguments = len(command) - 1
+        if arguments < minimum or \
+                (maximum is not None and arguments > maximum):
+            raise wrong_arguments(name)
+        return handler
+
+    def __execute(self, connection, command):
+        name = command[0].decode(errors='replace').lower()
+        try:
+            handler = self.__get_handler(name, command)
+            return handler(connection, *command[1:])
+        except RedisError as e:
+            return e
+
+    def __get(self, connection, key, kind=None):
+        data = self.__data[connection.db]
+        value = data.get(key)
+        if value is None:
+            return None
+        expires = self.__expires[connection.db]
+        if key in expires and expires[key] <= time.time():
+            del data[key]
+            del expires[key]
+            return None
+        if kind is not None and not isinstance(value, kind):
+            raise RedisError(WRONGTYPE)
+        return value
+
+    def __set(self, connection, key, value, keep_ttl=False):
+        self.__data[connection.db][key] = value
+        if not keep_ttl:
+            self.__expires[connection.db].pop(key, None)
+
+    def __delete(self, connection, key):
+        exists = self.__get(connection, key) is not None
+        self.__data[connection.db].pop(key, None)
+        self.__expires[connection.db].pop(key, None)
+        return exists
+
+    def __get_or_create(self, connection, key, kind):
+        value = self.__get(connection, key, kind)
+        if value is None:
+            value = kind()
+            self.__set(connection, key, value)
+        return value
+
+    def __delete_if_empty(self, connection, key, value):
+        if not value:
+            self.__delete(connection, key)
+
+    def __live_keys(self, connection):
+        return [
+            key for key in list(self.__data[connection.db])
+            if self.__get(connection, key) is not None
+        ]
+
+    # Connection
+
+    def _cmd_ping(self, connection, message=None):
+        return Status(b'PONG') if message is None else message
+
+    def _cmd_echo(self, connection, message):
+        return message
+
+    def _cmd_select(self, connection, db):
+        db = _int(db)
+        if not 0 <= db < self.databases:
+            raise RedisError('ERR DB index is out of range')
+        connection.db = db
+        return OK
+
+    def _cmd_auth(self, connection, *args):
+        return OK
+
+    def _cmd_hello(self, connection, *args):
+        if args:
+            protocol = _int(args[0])
+            if protocol not in (2, 3):
+                raise RedisError('NOPROTO unsupported protocol version')
+            connection.protocol = protocol
+        return {
+            b'server': b'redis',
+            b'version': b'7.0.0',
+            b'proto': connection.protocol,
+            b'id': id(connection),
+            b'mode': b'standalone',
+            b'role': b'master',
+            b'modules': [],
+        }
+
+    def _cmd_client(self, connection, subcommand, *args):
+        subcommand = subcommand.lower()
+        if subcommand == b'id':
+            return id(connection)
+        if subcommand == b'getname':
+            return None
+        return OK
+
+    def _cmd_quit(self, connection):
+        connection.close()
+        return OK
+
+    def _cmd_info(self, connection, *sections):
+        return b'# Server\r\nredis_version:7.0.0\r\nredis_mode:standalone\r\n'
+
+    # Transactions
+
+    def _cmd_multi(self, connection):
+        if connection.transaction is not None:
+            raise RedisError('ERR MULTI calls can not be nested')
+        connection.transaction = []
+        return OK
+
+    def _cmd_exec(self, connection):
+        if connection.transaction is None:
+            raise RedisError('ERR EXEC without MULTI')
+        commands, connection.transaction = connection.transaction, None
+        return [self.__execute(connection, command) for command in commands]
+
+    def _cmd_discard(self, connection):
+        if connection.transaction is None:
+            raise RedisError('ERR DISCARD without MULTI')
+        connection.transaction = None
+        return OK
+
+    def _cmd_watch(self, connection, *keys):
+        return OK
+
+    def _cmd_unwatch(self, connection):
+        return OK
+
+    # Keys
+
+    def _cmd_del(self, connection, key, *keys):
+        return sum(
+            self.__delete(connection, key) for key in (key,) + keys
+        )
+
+    _cmd_unlink = _cmd_del
+
+    def _cmd_exists(self, connection, key, *keys):
+        return sum(
+            self.__get(connection, key) is not None
+            for key in (key,) + keys
+        )
+
+    def _cmd_type(self, connection, key):
+        value = self.__get(connection, key)
+        names = {bytes: b'string', dict: b'hash', list: b'list', set: b'set'}
+        return Status(names.get(type(value), b'none'))
+
+    def _cmd_keys(self, connection, pattern):
+        pattern = pattern.decode(errors='surrogateescape')
+        return [
+            key for key in self.__live_keys(connection)
+            if fnmatch.fnmatchcase(
+                key.decode(errors='surrogateescape'), pattern
+            )
+        ]
+
+    def _cmd_scan(self, connection, cursor, *args):
+        options = dict(zip(
+            (arg.lower() for arg in args[::2]), args[1::2]
+        ))
+        cursor = _int(cursor)
+        count = _int(options.get(b'count', 10))
+        keys = sorted(self.__live_keys(connection))
+        page = keys[cursor:cursor + count]
+        next_cursor = cursor + count if cursor + count < len(keys) else 0
+        if b'match' in options:
+            pattern = options[b'match'].decode(errors='surrogateescape')
+            page = [
+                key for key in page
+                if fnmatch.fnmatchcase(
+                    key.decode(errors='surrogateescape'), pattern
+                )
+            ]
+        return [str(next_cursor).encode(), page]
+
+    def _cmd_dbsize(self, connection):
+        return len(self.__live_keys(connection))
+
+    def _cmd_flushdb(self, connection, *args):
+        self.__data[connection.db].clear()
+        self.__expires[connection.db].clear()
+        return OK
+
+    def _cmd_flushall(self, connection, *args):
+        self.reset()
+        return OK
+
+    def __expire_at(self, connection, key, deadline):
+        if self.__get(connection, key) is None:
+            return 0
+        if deadline <= time.time():
+            self.__delete(connection, key)
+        else:
+            self.__expires[connection.db][key] = deadline
+        return 1
+
+    def _cmd_expire(self, connection, key, seconds):
+        return self.__expire_at(connection, key, time.time() + _int(seconds))
+
+    def _cmd_pexpire(self, connection, key, milliseconds):
+        return self.__expire_at(
+            connection, key, time.time() + _int(milliseconds) / 1000
+        )
+
+    def _cmd_expireat(self, connection, key, timestamp):
+        return self.__expire_at(connection, key, _int(timestamp))
+
+    def _cmd_pexpireat(self, connection, key, timestamp):
+        return self.__expire_at(connection, key, _int(timestamp) / 1000)
+
+    def _cmd_persist(self, connection, key):
+        if self.__get(connection, key) is None:
+            return 0
+        return int(
+            self.__expires[connection.db].pop(key, None) is not None
+        )
+
+    def _cmd_pttl(self, connection, key):
+        if self.__get(connection, key) is None:
+            return -2
+        deadline = self.__expires[connection.db].get(key)
+        if deadline is None:
+            return -1
+        return max(0, int(round((deadline - time.time()) * 1000)))
+
+    def _cmd_ttl(self, connection, key):
+        ttl = self._cmd_pttl(connection, key)
+        return ttl if ttl < 0 else int(round(ttl / 1000))
+
+    # Strings
+
+    def _cmd_get(self, connection, key):
+        return self.__get(connection, key, bytes)
+
+    def _cmd_set(self, connection, key, value, *args):
+        options = [arg.lower() for arg in args]
+        deadline = None
+        keep_ttl = False
+        condition = None
+        get = False
+        position = 0
+        while position < len(options):
+            option = options[position]
+            if option in (b'ex', b'px', b'exat', b'pxat'):
+                if position + 1 == len(options):
+                    raise RedisError(SYNTAX)
+                amount = _int(args[position + 1])
+                if amount <= 0:
+                    raise RedisError(
+                        'ERR invalid expire time in \'set\' command'
+                    )
+                deadline = {
+                    b'ex': lambda: time.time() + amount,
+                    b'px': lambda: time.time() + amount / 1000,
+                    b'exat': lambda: amount,
+                    b'pxat': lambda: amount / 1000,
+                }[option]()
+                position += 1
+            elif option in (b'nx', b'xx'):
+                condition = option
+            elif option == b'keepttl':
+                keep_ttl = True
+            elif option == b'get':
+                get = True
+            else:
+                raise RedisError(SYNTAX)
+            position += 1
+
+        old = self.__get(connection, key, bytes if get else None)
+        if (condition == b'nx' and old is not None) or \
+                (condition == b'xx' and old is None):
+            return old if get else None
+        self.__set(connection, key, value, keep_ttl)
+        if deadline is not None:
+            self.__expires[connection.db][key] = deadline
+        return old if get else OK
+
+    def _cmd_setnx(self, connection, key, value):
+        return int(self._cmd_set(connection, key, value, b'NX') is OK)
+
+    def _cmd_setex(self, connection, key, seconds, value):
+        return self._cmd_set(connection, key, value, b'EX', seconds)
+
+    def _cmd_psetex(self, connection, key, milliseconds, value):
+        return self._cmd_set(connection, key, value, b'PX', milliseconds)
+
+    def _cmd_getset(self, connection, key, value):
+        return self._cmd_set(connection, key, value, b'GET')
+
+    def _cmd_getdel(self, connection, key):
+        value = self.__get(connection, key, bytes)
+        self.__delete(connection, key)
+        return value
+
+    def _cmd_mget(self, connection, key, *keys):
+        keys = (key,) + keys
+        return [
+            value if isinstance(value, bytes) else None
+            for value in (self.__get(connection, key) for key in keys)
+        ]
+
+    def _cmd_mset(self, connection, key, value, *pairs):
+        if len(pairs) % 2:
+            raise wrong_arguments('mset')
+        pairs = (key, value) + pairs
+        for key, value in zip(pairs[::2], pairs[1::2]):
+            self.__set(connection, key, value)
+        return OK
+
+    def _cmd_append(self, connection, key, value):
+        value = (self.__get(connection, key, bytes) or b'') + value
+        self.__set(connection, key, value, keep_ttl=True)
+        return len(value)
+
+    def _cmd_strlen(self, connection, key):
+        return len(self.__get(connection, key, bytes) or b'')
+
+    def _cmd_incrby(self, connection, key, amount):
+        value = _int(self.__get(connection, key, bytes) or 0) + _int(amount)
+        self.__set(connection, key, _number(value), keep_ttl=True)
+        return value
+
+    def _cmd_incr(self, connection, key):
+        return self._cmd_incrby(connection, key, b'1')
+
+    def _cmd_decrby(self, connection, key, amount):
+        return self._cmd_incrby(connection, key, b'%d' % -_int(amount))
+
+    def _cmd_decr(self, connection, key):
+        return self._cmd_incrby(connection, key, b'-1')
+
+    def _cmd_incrbyfloat(self, connection, key, amount):
+        value = _float(self.__get(connection, key, bytes) or 0) + \
+            _float(amount)
+        value = _number(value)
+        self.__set(connection, key, value, keep_ttl=True)
+        return value
+
+    # Hashes
+
+    def _cmd_hset(self, connection, key, field, field_value, *pairs):
+        if len(pairs) % 2:
+            raise wrong_arguments('hset')
+        pairs = (field, field_value) + pairs
+        value = self.__get_or_create(connection, key, dict)
+        added = 0
+        for field, field_value in zip(pairs[::2], pairs[1::2]):
+            added += field not in value
+            value[field] = field_value
+        return added
+
+    def _cmd_hmset(self, connection, key, field, field_value, *pairs):
+        if len(pairs) % 2:
+            raise wrong_arguments('hmset')
+        self._cmd_hset(connection, key, field, field_value, *pairs)
+        return OK
+
+    def _cmd_hsetnx(self, connection, key, field, field_value):
+        value = self.__get_or_create(connection, key, dict)
+        if field in value:
+            return 0
+        value[field] = field_value
+        return 1
+
+    def _cmd_hget(self, connection, key, field):
+        return (self.__get(connection, key, dict) or {}).get(field)
+
+    def _cmd_hmget(self, connection, key, field, *fields):
+        fields = (field,) + fields
+        value = self.__get(connection, key, dict) or {}
+        return [value.get(field) for field in fields]
+
+    def _cmd_hgetall(self, connection, key):
+        return dict(self.__get(connection, key, dict) or {})
+
+    def _cmd_hkeys(self, connection, key):
+        return list(self.__get(connection, key, dict) or {})
+
+    def _cmd_hvals(self, connection, key):
+        return list((self.__get(connection, key, dict) or {}).values())
+
+    def _cmd_hlen(self, connection, key):
+        return len(self.__get(connection, key, dict) or {})
+
+    def _cmd_hexists(self, connection, key, field):
+        return int(field in (self.__get(connection, key, dict) or {}))
+
+    def _cmd_hdel(self, connection, key, field, *fields):
+        fields = (field,) + fields
+        value = self.__get(connection, key, dict) or {}
+        deleted = sum(value.pop(field, None) is not None for field in fields)
+        self.__delete_if_empty(connection, key, value)
+        return deleted
+
+    def _cmd_hincrby(self, connection, key, field, amount):
+        value = self.__get_or_create(connection, key, dict)
+        result = _int(value.get(field, 0)) + _int(amount)
+        value[field] = _number(result)
+        return result
+
+    # Lists
+
+    def _cmd_lpush(self, connection, key, item, *values):
+        values = (item,) + values
+        value = self.__get_or_create(connection, key, list)
+        value[:0] = reversed(values)
+        return len(value)
+
+    def _cmd_rpush(self, connection, key, item, *values):
+        values = (item,) + values
+        value = self.__get_or_create(connection, key, list)
+        value.extend(values)
+        return len(value)
+
+    def __pop(self, connection, key, count, index):
+        value = self.__get(connection, key, list)
+        if value is None:
+            return None
+        if count is None:
+            popped = value.pop(index)
+        else:
+            count = _int(count)
+            if index == 0:
+                popped, value[:count] = value[:count], []
+            else:
+                popped = value[len(value) - count:][::-1]
+                del value[len(value) - count:]
+        self.__delete_if_empty(connection, key, value)
+        return popped
+
+    def _cmd_lpop(self, connection, key, count=None):
+        return self.__pop(connection, key, count, 0)
+
+    def _cmd_rpop(self, connection, key, count=None):
+        return self.__pop(connection, key, count, -1)
+
+    def _cmd_llen(self, connection, key):
+        return len(self.__get(connection, key, list) or [])
+
+    def _cmd_lrange(self, connection, key, start, stop):
+        value = self.__get(connection, key, list) or []
+        start, stop = _int(start), _int(stop)
+        if start < 0:
+            start = max(0, len(value) + start)
+        if stop < 0:
+            stop = len(value) + stop
+            if stop < 0:
+                return []
+        return value[start:stop + 1]
+
+    def _cmd_lindex(self, connection, key, index):
+        value = self.__get(connection, key, list) or []
+        index = _int(index)
+        return value[index] if -len(value) <= index < len(value) else None
+
+    # Sets
+
+    def _cmd_sadd(self, connection, key, member, *members):
+        members = (member,) + members
+        value = self.__get_or_create(connection, key, set)
+        size = len(value)
+        value.update(members)
+        return len(value) - size
+
+    def _cmd_srem(self, connection, key, member, *members):
+        members = (member,) + members
+        value = self.__get(connection, key, set) or set()
+        size = len(value)
+        value.difference_update(members)
+        removed = size - len(value)
+        self.__delete_if_empty(connection, key, value)
+        return removed
+
+    def _cmd_smembers(self, connection, key):
+        return Members(sorted(self.__get(connection, key, set) or ()))
+
+    def _cmd_sismember(self, connection, key, member):
+        return int(member in (self.__get(connection, key, set) or ()))
+
+    def _cmd_scard(self, connection, key):
+        return len(self.__get(connection, key, set) or ())
@@ -0,0 +1,137 @@
+import fnmatch
+import re
+import sys
+from collections import OrderedDict
+
+
+__all__ = ('CallSiteMatcher',)
+
+
+class CallSiteMatcher:
+    """
+        Decides whether a call stack is allowed to make network requests.
+
+        Rules are dotted module or qualified function globs such as
+          'myapp.cache.*' or 'myapp.clients.Client.fetch'. Each frame is
+          named by its module (frame.f_globals['__name__']) and by its module
+          plus qualified function name (code.co_qualname). Frames are checked
+          from the innermost outwards and the first frame matching a rule
+          decides; deny rules win over allow rules for the same frame. Frames
+          whose file lives in one of the allowed packages count as allowed.
+
+        Rules are compiled into a single regular expression per list and the
+          verdict for each code object is memoized, so finer grained rules
+          add no cost once a call site has been seen. At most MAX_VERDICTS
+          verdicts are kept; the memo starts over once it is full, and
+          whenever sys.path changes if any packages are allowed.
+
+        Attributes:
+          allowed_modules (tuple of strings): Globs for code that is allowed
+            to make network requests.
+          denied_modules (tuple of strings): Globs for code that is never
+            allowed to make network requests.
+          allowed_packages (tuple of strings): Package directory names that
+            are allowed to make network requests.
+    """
+
+    ALLOW = True
+    DENY = False
+
+    MAX_MATCHERS = 64
+    MAX_VERDICTS = 10000
+
+    __matchers = OrderedDict()
+
+    def __init__(self, allowed_modules=(), denied_modules=(),
+                 allowed_packages=()):
+        self.allowed_modules = tuple(allowed_modules)
+        self.denied_modules = tuple(denied_modules)
+        self.allowed_packages = tuple(allowed_packages)
+
+        self.__allow = self.__compile(self.allowed_modules)
+        self.__deny = self.__compile(self.denied_modules)
+        self.__package_dirs = tuple(
+            '/%s/' % package for package in self.allowed_packages
+        )
+        self.__verdicts = {}
+        self.__sys_path = list(sys.path)
+
+    @classmethod
+    def for_rules(cls, allowed_modules=(), denied_modules=(),
+                  allowed_packages=()):
+        """
+            Returns a shared matcher for a set of rules so that blockers
+              created per test reuse compiled rules and memoized verdicts.
+              The MAX_MATCHERS most recently used matchers are kept.
+        """
+        key = (
+            tuple(allowed_modules or ()),
+            tuple(denied_modules or ()),
+            tuple(allowed_packages or ())
+        )
+        matchers = cls.__matchers
+        try:
+            matchers.move_to_end(key)
+            return matchers[key]
+        except KeyError:
+            matcher = matchers[key] = cls(*key)
+            while len(matchers) > cls.MAX_MATCHERS:
+                matchers.popitem(last=False)
+            return matcher
+
+    @staticmethod
+    def __compile(patterns):
+        if not patterns:
+            return None
+        return re.compile('|'.join(
+            '(?:%s)' % fnmatch.translate(pattern) for pattern in patterns
+        )).match
+
+    def __package_allowed(self, filename):
+        for package_dir in self.__package_dirs:
+            index = filename.find(package_dir)
+            if index != -1 and filename[:index] in sys.path:
+                return True
+        return False
+
+    def __verdict(self, code, module):
+        """
+            Returns ALLOW, DENY or None if no rule applies to a code object.
+        """
+        # co_qualname was added in Python 3.11
+        function = '%s.%s' % (
+            module, getattr(code, 'co_qualname', code.co_name)
+        )
+
+        if self.__deny and (self.__deny(module) or self.__deny(function)):
+            return self.DENY
+        if self.__allow and (self.__allow(module) or self.__allow(function)):
+            return self.ALLOW
+        if self.__package_allowed(code.co_filename):
+            return self.ALLOW
+        return None
+
+    def frame_allowed(self, frame) -> bool:
+        """
+            Returns a boolean if the call stack ending in frame is allowed to
+              make network requests.
+        """
+        verdicts = self.__verdicts
+        if self.__package_dirs and sys.path != self.__sys_path:
+            # Package verdicts depend on where packages are imported from
+            verdicts.clear()
+            self.__sys_path = list(sys.path)
+        while frame is not None:
+            code = frame.f_code
+            try:
+                verdict = verdicts[code]
+            except KeyError:
+                if len(verdicts) >= self.MAX_VERDICTS:
+                    verdicts.clear()
+                verdict = verdicts[code] = self.__verdict(
+                    code, frame.f_globals.get('__name__', '')
+                )
+            if verdict is not None:
+                return verdict
+            frame = frame.f_back
+        return False
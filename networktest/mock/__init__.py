@@ -1,6 +1,22 @@
-from .api import HttpApiMock, HttpApiMockEndpoint, HttpApiMockEndpoints, HttpApiMockResponse
-from .http import HttpMock, HttpMockManager
+from .._lazy import lazy_module
+
+_LAZY_ATTRIBUTES = {
+    'HttpApiMock': '.api',
+    'HttpApiMockEndpoint': '.api',
+    'HttpApiMockEndpoints': '.api',
+    'HttpApiMockResponse': '.api',
+    'HttpApiMockResource': '.api',
+    'HttpApiMockSession': '.api',
+    'HttpMock': '.http',
+    'HttpMockManager': '.http',
+    'ResourceStore': '.store',
+}
+
 __all__ = (
-    'HttpApiMock', 'HttpApiMockEndpoint', 'HttpApiMockEndpoints', 'HttpApiMockResponse',
-    'HttpMock', 'HttpMockManager'
+    'HttpApiMock', 'HttpApiMockEndpoint', 'HttpApiMockEndpoints',
+    'HttpApiMockResponse', 'HttpApiMockResource', 'HttpApiMockSession',
+    'HttpMock', 'HttpMockManager', 'ResourceStore'
 )
+
+
+__getattr__, __dir__ = lazy_module(__name__, _LAZY_ATTRIBUTES)
@@ -1,30 +1,61 @@
+import os
 import re
 import json
 from unittest.mock import MagicMock
 from copy import copy
 from http.client import HTTPResponse, responses
+from urllib.parse import parse_qsl
+from time import perf_counter
 import io
 
+from . import latency
 from .http import HttpMock
+from .store import ResourceStore
 
 
 __all__ = (
-    'HttpApiMockEndpoint', 'HttpApiMockEndpoints',
-    'HttpApiMock', 'HttpApiMockResponse'
+    'HttpApiMockEndpoint', 'HttpApiMockEndpoints', 'HttpApiMock',
+    'HttpApiMockResponse', 'HttpApiMockResource', 'HttpApiMockSession'
 )
 
 
-def make_response_class(status_code, body):
+def make_response(status_code, body, headers=None, keep_alive=True):
+    """
+        Returns:
+            HttpApiMockResponse: A complete HTTP/1.1 response which is framed
+              with Content-Length so clients don't have to read until the
+              connection closes and can reuse it if keep_alive is True.
+    """
     status = str(status_code)
     if status_code in responses:
         status += ' ' + responses[status_code]
 
-    data = 'HTTP/1.1 {status}\n\n{body}'.format(
+    if isinstance(body, str):
+        body = body.encode()
+
+    default_headers = {
+        'Content-Length': str(len(body)),
+        'Connection': 'keep-alive' if keep_alive else 'close',
+    }
+    if body:
+        default_headers['Content-Type'] = 'application/json'
+    if headers:
+        overridden = {name.lower() for name in headers}
+        default_headers = {
+            name: value for name, value in default_headers.items()
+            if name.lower() not in overridden
+        }
+        default_headers.update(headers)
+
+    data = 'HTTP/1.1 {status}\r\n{headers}\r\n'.format(
         status=status,
-        body=body
-    ).encode()
+        headers=''.join(
+            '{}: {}\r\n'.format(name, value)
+            for name, value in default_headers.items()
+        )
+    ).encode() + body
 
-    return HttpApiMockResponse(data)._get_class()
+    return HttpApiMockResponse(data)
 
 
 class HttpApiMockResponse:
@@ -58,6 +89,52 @@ class HttpApiMockResponse:
         return _HTTPResponseMock
 
 
+_timed_response_classes = {}
+
+
+def _get_timed_response_class(base):
+    """
+        Returns:
+            http.client.HTTPResponse: A subclass of base that records how
+              long it takes for response headers and bodies to arrive.
+    """
+    try:
+        return _timed_response_classes[base]
+    except KeyError:
+        pass
+
+    class _TimedHTTPResponse(base):
+        _networktest_timing = None
+        _networktest_body_timed = False
+
+        def begin(self):
+            super().begin()
+            if self._networktest_timing:
+                recorder, host, endpoint, start = self._networktest_timing
+                recorder.record(
+                    host, endpoint, 'headers', perf_counter() - start
+                )
+
+        def _close_conn(self):
+            super()._close_conn()
+            if self._networktest_timing and not self._networktest_body_timed:
+                self._networktest_body_timed = True
+                recorder, host, endpoint, start = self._networktest_timing
+                recorder.record(host, endpoint, 'body', perf_counter() - start)
+
+    _timed_response_classes[base] = _TimedHTTPResponse
+    return _TimedHTTPResponse
+
+
+def _restore_response_class(connection):
+    """
+        Removes a response class set on a connection by a mock so that the
+          next response it reads uses the class default again, even if the
+          connection is reused after the mock has exited.
+    """
+    connection.__dict__.pop('response_class', None)
+
+
 class HttpApiMockEndpoint:
     """
         Describes mocking behavior for a single endpoint on an API managed by
@@ -70,9 +147,13 @@ class HttpApiMockEndpoint:
           match_pattern (str): Regular expression used to identify
             the endpoint.
           response (function, lambda): Function called to generate
-            a response from a request to this endpoint.
+            a response from a request to this endpoint. It returns a tuple of
+            (status code, JSON body) or (status code, JSON body, headers), or
+            an :class:`HttpApiMockResponse`.
           request_mock (MagicMock): Mock that contains information about
             when this endpoint was called and with what arguments.
+          calls (list of dicts): The groups matched by every request to this
+            endpoint. A cheaper alternative to request_mock.
     """
 
     def __init__(self, operation_id, match_pattern, response):
@@ -80,87 +161,442 @@ class HttpApiMockEndpoint:
         self.match_pattern = match_pattern
         self.response = response
 
-        self.request_mock = MagicMock()
+        self.calls = []
+        self.__default_response = response
+        self.__pattern = None
+        self.__request_mock = None
+
+    @property
+    def request_mock(self):
+        # Creating a MagicMock is expensive compared to everything else an
+        #   endpoint does so it is only created once it is asked for
+        if self.__request_mock is None:
+            request_mock = MagicMock()
+            for groups in self.calls:
+                request_mock(groups)
+            self.__request_mock = request_mock
+        return self.__request_mock
+
+    @request_mock.setter
+    def request_mock(self, request_mock):
+        self.__request_mock = request_mock
+
+    def _compile(self):
+        """
+            Compiles match_pattern unless it already has been.
+
+            Returns:
+                HttpApiMockEndpoint: This endpoint.
+        """
+        if self.__pattern is None or \
+                self.__pattern.pattern != self.match_pattern:
+            self.__pattern = re.compile(self.match_pattern)
+        return self
 
     def __request_matches(self, data):
-        return re.match(self.match_pattern, data)
+        return self._compile().__pattern.match(data)
 
-    def _get_matched_response(self, data):
+    def reset(self):
+        """
+            Forgets all calls to this endpoint and restores the response it
+              was defined with.
+        """
+        self.response = self.__default_response
+        self.calls = []
+        if self.__request_mock is not None:
+            self.__request_mock.reset_mock()
+
+    def _get_matched(self, data, keep_alive=True):
+        """
+            Returns:
+                HttpApiMockResponse: The response to a matching request or
+                  False if the request doesn't match this endpoint.
+        """
         match = self.__request_matches(data)
         if match:
             groups = {
-                key: value.decode() for key, value in match.groupdict().items()
+                key: None if value is None else value.decode()
+                for key, value in match.groupdict().items()
             }
-            self.request_mock(groups)
+            self.calls.append(groups)
+            if self.__request_mock is not None:
+                self.__request_mock(groups)
 
             response = self.response(groups)
             if isinstance(response, tuple):
-                (code, body) = self.response(groups)
+                (code, body, *headers) = response
                 if body is None:
                     body = ''
                 else:
                     body = json.dumps(body)
 
-                return make_response_class(
+                return make_response(
                     status_code=code,
-                    body=body
+                    body=body,
+                    headers=headers[0] if headers else None,
+                    keep_alive=keep_alive
                 )
             if isinstance(response, HttpApiMockResponse):
-                return response._get_class()
+                return response
             raise TypeError("HttpApiMockEndpoint response must be of type tuple or HttpApiMockResponse")
 
         return False
 
     def __copy__(self):
-        return HttpApiMockEndpoint(
-            self.operation_id,
-            self.match_pattern,
-            copy(self.response)
+        endpoint = type(self).__new__(type(self))
+        endpoint.__dict__.update(self.__dict__)
+        # Shares the compiled pattern but none of the calls
+        endpoint.__default_response = self.response
+        endpoint.calls = []
+        endpoint.__request_mock = None
+        return endpoint
+
+    def _with_response(self, response):
+        """
+            Returns:
+                HttpApiMockEndpoint: A copy of this endpoint defined with a
+                  different response.
+        """
+        endpoint = copy(self)
+        endpoint.response = endpoint.__default_response = response
+        return endpoint
+
+
+def _parse_value(value):
+    """
+        Turns a value from a URL into the JSON value it most likely
+          represents (eg. '5' to 5) or leaves it as a string.
+    """
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+class HttpApiMockResource:
+    """
+        Describes a collection of resources on an API managed by
+          :class:`HttpApiMock`. Each mock instance serves the collection from
+          its own :class:`ResourceStore` through CRUD endpoints.
+
+        For a resource named 'videos' at '/videos/' the endpoints are:
+          * list_videos - GET /videos/ supporting limit, offset and cursor
+            query parameters. Any other query parameter filters by the value
+            of that key.
+          * create_videos - POST /videos/ with a JSON body
+          * get_videos - GET /videos/<id>/
+          * update_videos - PATCH or PUT /videos/<id>/ with a JSON body
+          * delete_videos - DELETE /videos/<id>/
+
+        Lists respond with {"results": [...], "next_cursor": "..."}.
+
+        Attributes:
+          name (str): Used to name the endpoints and to access the store from
+            :class:`HttpApiMockEndpoints`.
+          path (str): Path of the collection.
+          id_field (str): Key of the id in each resource.
+          indexes (list of strings): Keys that are indexed for filtering.
+          page_size (int): Number of resources listed when no limit is given.
+          seed (list of dicts, function): Resources every store starts with
+            or a function returning them. A function is only called once.
+    """
+
+    __prototype = None
+    __templates = None
+
+    def __init__(self, name, path, id_field='id', indexes=(), page_size=50,
+                 seed=()):
+        self.name = name
+        self.path = path
+        self.id_field = id_field
+        self.indexes = indexes
+        self.page_size = page_size
+        self.seed = seed
+
+    def _get_store(self):
+        """
+            Returns:
+                ResourceStore: A store with the seed resources that resets
+                  to them. Seeding happens once per resource and every store
+                  is a cheap copy of the result.
+        """
+        if self.__prototype is None:
+            prototype = ResourceStore(
+                id_field=self.id_field,
+                indexes=self.indexes
+            )
+            prototype.seed(self.seed() if callable(self.seed) else self.seed)
+            self.__prototype = prototype
+        return self.__prototype.copy()
+
+    def _get_endpoints(self, store):
+        """
+            Returns:
+                tuple: The endpoints serving store. Their patterns are only
+                  compiled once per resource.
+        """
+        responses = self.__get_responses(store)
+        if self.__templates is None:
+            self.__templates = tuple(
+                endpoint._compile() for endpoint in self.__get_templates()
+            )
+        return tuple(
+            template._with_response(responses[template.operation_id])
+            for template in self.__templates
         )
 
+    def __get_templates(self):
+        path = re.escape(self.path.strip('/').encode())
+        collection = b'/' + path + rb'/?(?:\?(?P<query>\S*))? HTTP/'
+        item = b'/' + path + rb'/(?P<id>[^/?\s]+)/?(?:\?\S*)? HTTP/'
+        body = rb'.*?\r\n\r\n(?P<body>.*)'
+
+        return (
+            HttpApiMockEndpoint(
+                operation_id='list_' + self.name,
+                match_pattern=b'^GET ' + collection,
+                response=None
+            ),
+            HttpApiMockEndpoint(
+                operation_id='create_' + self.name,
+                match_pattern=b'(?s)^POST ' + collection + body,
+                response=None
+            ),
+            HttpApiMockEndpoint(
+                operation_id='get_' + self.name,
+                match_pattern=b'^GET ' + item,
+                response=None
+            ),
+            HttpApiMockEndpoint(
+                operation_id='update_' + self.name,
+                match_pattern=b'(?s)^(?:PATCH|PUT) ' + item + body,
+                response=None
+            ),
+            HttpApiMockEndpoint(
+                operation_id='delete_' + self.name,
+                match_pattern=b'^DELETE ' + item,
+                response=None
+            ),
+        )
+
+    def __get_responses(self, store):
+        """
+            Returns:
+                dict: Response functions serving store by operation_id.
+        """
+        def get_id(groups):
+            resource_id = _parse_value(groups['id'])
+            return resource_id if resource_id in store else groups['id']
+
+        def get_body(groups):
+            try:
+                changes = json.loads(groups['body'] or 'null')
+            except ValueError:
+                return None
+            return changes if isinstance(changes, dict) else None
+
+        def list_response(groups):
+            query = dict(parse_qsl(groups['query'] or ''))
+            cursor = query.pop('cursor', None)
+            try:
+                limit = int(query.pop('limit', self.page_size))
+                offset = int(query.pop('offset', 0))
+                results, next_cursor = store.list(
+                    filters={
+                        key: _parse_value(value)
+                        for key, value in query.items()
+                    },
+                    offset=offset,
+                    limit=limit,
+                    cursor=cursor
+                )
+            except ValueError as e:
+                return 400, {'error': str(e)}
+            return 200, {'results': results, 'next_cursor': next_cursor}
+
+        def create_response(groups):
+            resource = get_body(groups)
+            if resource is None:
+                return 400, {'error': 'Body must be a JSON object'}
+            try:
+                return 201, store.create(resource)
+            except KeyError as e:
+                return 409, {'error': e.args[0]}
+
+        def get_response(groups):
+            resource = store.get(get_id(groups))
+            return (200, resource) if resource is not None else (404, None)
+
+        def update_response(groups):
+            changes = get_body(groups)
+            if changes is None:
+                return 400, {'error': 'Body must be a JSON object'}
+            resource = store.update(get_id(groups), changes)
+            return (200, resource) if resource is not None else (404, None)
+
+        def delete_response(groups):
+            resource = store.delete(get_id(groups))
+            return (204, None) if resource is not None else (404, None)
+
+        return {
+            'list_' + self.name: list_response,
+            'create_' + self.name: create_response,
+            'get_' + self.name: get_response,
+            'update_' + self.name: update_response,
+            'delete_' + self.name: delete_response,
+        }
+
 
 class HttpApiMockEndpoints:
     """
         Returned by :class:`HttpApiMock`.__enter__ and used to expose
-          a group of :class:`HttpApiMockEndpoint` that describes an API.
+          a group of :class:`HttpApiMockEndpoint` that describes an API and
+          the :class:`ResourceStore` of each :class:`HttpApiMockResource`.
     """
 
-    def __init__(self, endpoints):
+    def __init__(self, endpoints, stores=None):
         self.endpoints = {
             endpoint.operation_id: endpoint for endpoint in endpoints
         }
+        self.stores = {} if stores is None else stores
 
     def __getattr__(self, name):
-        return self.endpoints[name]
+        if name in self.endpoints:
+            return self.endpoints[name]
+        return self.stores[name]
 
 
 class HttpApiMock(HttpMock):
     """
         Context manager that mocks HTTP requests for a list of known hostnames.
+
+        Responses are framed with Content-Length. Unless keep_alive is False
+          or the request asks for the connection to be closed they also
+          keep the connection alive so that connection pools reuse
+          connections like they would in production.
+
+        With shared=True, child processes forked while the mock is active
+          forward the requests it matches to this instance so that
+          responses, resources and request_mock calls are shared with the
+          parent. This requires the fork start method.
+
+        In WATCH mode the time each request takes to receive response
+          headers and to finish its body is recorded in latency_recorder,
+          grouped by hostname and the operation_id of the matching endpoint
+          ('*' if no endpoint matches).
+
+        Endpoint patterns are compiled once per subclass so creating an
+          instance only copies the endpoints' call logs and responses. Use
+          reset, or :class:`HttpApiMockSession`, to reuse one instance
+          across tests instead.
     """
 
     hostnames = ()
     endpoints = ()
-    __mock_next_body = False
-
-    def __init__(self, *args, **kwargs):
-        self.endpoints = tuple(copy(endpoint) for endpoint in self.endpoints)
+    resources = ()
+    keep_alive = True
+    latency_recorder = latency.recorder
+    __request = None
+    __server = None
+    __token = None
+    __request_line = re.compile(rb'[A-Z]+ \S+ HTTP/\d\.\d\r\n')
+    __compiled = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._get_compiled_endpoints()
+
+    @classmethod
+    def _get_compiled_endpoints(cls):
+        """
+            Returns:
+                tuple: The endpoints defined on this class with their
+                  patterns compiled. They are compiled again if endpoints
+                  has been replaced since.
+        """
+        compiled = cls.__dict__.get('_HttpApiMock__compiled')
+        if compiled is None or compiled[0] is not cls.endpoints:
+            endpoints = tuple(
+                endpoint._compile() for endpoint in cls.endpoints
+            )
+            compiled = cls.__compiled = (cls.endpoints, endpoints)
+        return compiled[1]
+
+    def __init__(self, *args, shared=False, **kwargs):
+        self.shared = shared
+        self.stores = {
+            resource.name: resource._get_store()
+            for resource in self.resources
+        }
+        self.endpoints = tuple(
+            copy(endpoint) for endpoint in self._get_compiled_endpoints()
+        ) + tuple(
+            endpoint for resource in self.resources
+            for endpoint in resource._get_endpoints(self.stores[resource.name])
+        )
         super().__init__(*args, **kwargs)
 
     def __enter__(self):
+        if self.shared and self.mode != self.Modes.DISABLED:
+            # Imported here as multiprocessing is slow to import and only
+            #   needed by shared mocks
+            from .shared import SharedMockServer
+            self.__server, self.__token = SharedMockServer.register(self)
         super().__enter__()
-        return HttpApiMockEndpoints(self.endpoints)
+        return HttpApiMockEndpoints(self.endpoints, self.stores)
+
+    def __exit__(self, type, value, traceback):
+        super().__exit__(type, value, traceback)
+        if self.__server is not None and \
+                self.__server.pid == os.getpid():
+            self.__server.unregister(self.__token)
+            self.__server = None
+
+    def reset(self):
+        """
+            Forgets all requests and restores every endpoint's response and
+              every store's resources to how they were defined so the mock
+              can be reused by another test.
+        """
+        self.__request = None
+        for endpoint in self.endpoints:
+            endpoint.reset()
+        for store in self.stores.values():
+            store.reset()
+        self.send_mock = None
+
+    def __get_remote(self):
+        """
+            Returns:
+                SharedMockClient: Client used to forward requests to the
+                  parent process when running in a forked child.
+        """
+        if self.__server is not None and self.__server.pid != os.getpid():
+            from .shared import SharedMockClient
+            return SharedMockClient.connect(self.__server)
+        return None
 
-    def __is_request_body(self, data):
+    def _handle_shared_request(self, data):
         """
-            True if the provided request data is for a request body.
-            This is needed because the request body is sent separately from
-              the rest of the request.
+            Returns the full response to a request forwarded by a child
+              process.
         """
-        # Is there a better way to confirm this without:
-        #   * reimplementing HTTP library code
-        #   * overcomplicating the solution
-        return data[-4:] != b'\r\n\r\n'
+        return self.__get_targeted_response(data)._data
+
+    def _handle_shared_record(self, data):
+        """
+            Records a watched request forwarded by a child process.
+        """
+        self.__get_targeted_response(data)
+
+    def __is_request_head(self, data):
+        """
+            True if the provided request data starts a new request.
+            This is needed because the request body may be sent separately
+              from the rest of the request.
+        """
+        return self.__request_line.match(data) is not None and \
+            b'\r\n\r\n' in data
 
     def __get_request_hostname(self, data):
         """
@@ -169,25 +605,38 @@ class HttpApiMock(HttpMock):
         start = b'\r\nHost: '
         end = b'\r\n'
 
-        if not self.__is_request_body(data) and start in data:
-            hostname = data[data.find(start) + len(start):]
+        if not self.__is_request_head(data):
+            return None
+
+        head = data[:data.find(b'\r\n\r\n') + len(end)]
+        if start in head:
+            hostname = head[head.find(start) + len(start):]
             hostname = hostname[:hostname.find(end)]
             if b':' in hostname:
                 hostname = hostname[:hostname.find(b':')]
             hostname = hostname.decode()
             return hostname
 
-    def __get_default_response(self):
+    def __get_default_response(self, keep_alive=True):
         """
             The default response to return on all HTTP requests for the
               specified hostnames.
-            By default this is a MagicMock.
+            By default this is an empty 200 response.
         """
-        return make_response_class(
+        return make_response(
             status_code=200,
-            body=''
+            body='',
+            keep_alive=keep_alive
         )
 
+    def __keep_alive(self, data):
+        """
+            True if the connection a request was made on should be kept
+              alive after the response.
+        """
+        head = data[:data.find(b'\r\n\r\n') + 2].lower()
+        return self.keep_alive and b'\r\nconnection: close\r\n' not in head
+
     def __get_targeted_response(self, data):
         """
             A more specific response to return on all HTTP requests for
@@ -197,12 +646,57 @@ class HttpApiMock(HttpMock):
               an endpoint to specific responses.
         """
 
+        return self.__match(data)[1]
+
+    def __match(self, data):
+        """
+            Returns:
+                tuple: The operation_id of the endpoint matching a request
+                  ('*' if none match) and its response.
+        """
+        keep_alive = self.__keep_alive(data)
         for endpoint in self.endpoints:
-            response_class = endpoint._get_matched_response(data)
-            if response_class:
-                return response_class
+            response = endpoint._get_matched(data, keep_alive)
+            if response:
+                return endpoint.operation_id, response
 
-        return self.__get_default_response()
+        return '*', self.__get_default_response(keep_alive)
+
+    def __get_timed_response(self, connection, hostname, endpoint):
+        """
+            Returns a response class for a watched request which records
+              its latency. It is only used for a single response.
+        """
+        timing = (self.latency_recorder, hostname, endpoint, perf_counter())
+        timed_class = _get_timed_response_class(
+            type(connection).response_class
+        )
+
+        def response_class(*args, **kwargs):
+            _restore_response_class(connection)
+            response = timed_class(*args, **kwargs)
+            response._networktest_timing = timing
+            return response
+        return response_class
+
+    def __get_deferred_response(self, connection, request):
+        """
+            Returns a response class which matches the request once it has
+              been completely sent so that endpoints can match the body of
+              a request as well as its head. It is only used for a single
+              response.
+        """
+        def response_class(*args, **kwargs):
+            _restore_response_class(connection)
+            remote = self.__get_remote()
+            if remote is not None:
+                response = HttpApiMockResponse(
+                    remote.request(self.__token, bytes(request))
+                )
+            else:
+                response = self.__get_targeted_response(bytes(request))
+            return response._get_class()(*args, **kwargs)
+        return response_class
 
     @staticmethod
     def mockable_send(self, data, mock):
@@ -221,14 +715,84 @@ class HttpApiMock(HttpMock):
         """
         hostname = mock.__get_request_hostname(data)
         if hostname and hostname in mock.hostnames:
-            response_class = mock.__get_targeted_response(data)
+            mock.__request = bytearray(data)
             if mock.mode == mock.Modes.MOCK:
-                self.response_class = response_class
-
-            mock.__mock_next_body = True
+                self.response_class = mock.__get_deferred_response(
+                    self, mock.__request
+                )
+            else:
+                remote = mock.__get_remote()
+                if remote is not None:
+                    remote.record(mock.__token, bytes(data))
+                else:
+                    endpoint, _ = mock.__match(data)
+                    self.response_class = mock.__get_timed_response(
+                        self, hostname, endpoint
+                    )
             return False
         elif hostname:
-            mock.__mock_next_body = False
-        elif mock.__mock_next_body:
-            mock.__mock_next_body = False
+            mock.__request = None
+        elif mock.__request is not None:
+            # The rest of a request whose head has already been mocked
+            mock.__request += data
             return False
+
+
+class HttpApiMockSession:
+    """
+        Keeps one instance of each :class:`HttpApiMock` subclass for many
+          tests, eg. a whole pytest session, so that large mocks are only
+          created once.
+
+        Mocks are reset every time they are entered through enter and are
+          exited by exit_all, at the end of each test, or by close.
+    """
+
+    def __init__(self):
+        self.__mocks = {}
+        self.__entered = []
+
+    def get(self, mock_class, **kwargs):
+        """
+            Returns:
+                HttpApiMock: The instance of mock_class created with kwargs,
+                  creating it the first time it is asked for.
+        """
+        key = (mock_class, tuple(sorted(kwargs.items())))
+        mock = self.__mocks.get(key)
+        if mock is None:
+            mock = self.__mocks[key] = mock_class(**kwargs)
+        return mock
+
+    def enter(self, mock_class, **kwargs):
+        """
+            Resets and enters the instance of mock_class created with kwargs.
+
+            Returns:
+                HttpApiMockEndpoints: The endpoints and stores of the mock.
+        """
+        mock = self.get(mock_class, **kwargs)
+        if mock in self.__entered:
+            self.__entered.remove(mock)
+            mock.__exit__(None, None, None)
+        mock.reset()
+        endpoints = mock.__enter__()
+        self.__entered.append(mock)
+        return endpoints
+
+    def exit_all(self):
+        """
+            Exits every mock entered through enter.
+        """
+        while self.__entered:
+            self.__entered.pop().__exit__(None, None, None)
+
+    def close(self):
+        self.exit_all()
+        self.__mocks.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
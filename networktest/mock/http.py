@@ -1,14 +1,51 @@
+import _socket
 import http
+import socket
+import weakref
 from unittest.mock import MagicMock
 from enum import Enum, auto
 
+from ..simulated import SimulatedSocket
+
+
+class MockedConnectionSocket(SimulatedSocket):
+    """
+        Socket given to an HTTPConnection whose requests are mocked so that
+          connection pools (eg. urllib3) consider it open and reuse it
+          between requests like they would in production.
+
+        Pools poll a connection's socket to check whether it has been
+          dropped so every instance shares the file descriptor of a single
+          idle socket which never becomes readable.
+    """
+
+    __idle = None
+
+    def __init__(self):
+        super().__init__(connect_errno=None)
+
+    def fileno(self):
+        if self._closed:
+            return -1
+        if MockedConnectionSocket.__idle is None:
+            # Created through _socket so NetworkBlocker doesn't interfere
+            socketpair = getattr(_socket, 'socketpair', socket.socketpair)
+            MockedConnectionSocket.__idle = socketpair()
+        return MockedConnectionSocket.__idle[0].fileno()
+
 
 class HttpMockManager:
     """
         Handles mocking of HTTP requests by multiple mocks.
+
+        Attributes:
+          mocked_hosts (set): Hosts of connections whose requests have been
+            mocked. Never cleared by this class.
     """
 
+    mocked_hosts = set()
     __mocks = []
+    __connections = weakref.WeakSet()
     __original_send = None
     __overriden_mocks = {}
 
@@ -74,6 +111,10 @@ class HttpMockManager:
             if mock.mockable_send(self, data, mock) is False:
                 mock.send_mock(self, data)
                 if mock.mode == http_mock.Modes.MOCK:
+                    http_mock.mocked_hosts.add(self.host)
+                    if self.sock is None:
+                        self.sock = MockedConnectionSocket()
+                        http_mock.__connections.add(self)
                     return
         http_mock.__original_send(self, data)
 
@@ -100,13 +141,31 @@ class HttpMockManager:
                 return cls.__replacement_send(connection, data, cls)
             http.client.HTTPConnection.send = fill_mock_args
 
+    @classmethod
+    def __detach_sockets(cls):
+        """
+            Takes every MockedConnectionSocket away from the connection it
+              was given to so that pooled connections open a real socket
+              the next time they are used.
+        """
+        for connection in list(cls.__connections):
+            if isinstance(connection.sock, MockedConnectionSocket):
+                connection.sock.close()
+                connection.sock = None
+        cls.__connections.clear()
+
     @classmethod
     def exit(cls, mock):
         """
             Unregister a mock with this class and stop mocking requests if
               no other mocks are active.
+
+            Connections mocked by any mock are detached from their mocked
+              socket. Those still mocked get a new one on their next
+              request.
         """
         cls.__unregister_mock(mock)
+        cls.__detach_sockets()
 
         if not cls.__mocks and cls.__original_send is not None:
             http.client.HTTPConnection.send = cls.__original_send
@@ -126,7 +185,18 @@ class HttpMock:
         if mode is None:
             mode = self.Modes.MOCK
         self.mode = mode
-        self.send_mock = MagicMock()
+        self.__send_mock = None
+
+    @property
+    def send_mock(self):
+        # Only created when used since it costs more than the rest of a mock
+        if self.__send_mock is None:
+            self.__send_mock = MagicMock()
+        return self.__send_mock
+
+    @send_mock.setter
+    def send_mock(self, send_mock):
+        self.__send_mock = send_mock
 
     def __enter__(self):
         HttpMockManager.enter(self)
@@ -0,0 +1,166 @@
+import atexit
+import json
+import math
+import os
+import threading
+
+
+__all__ = ('LatencyHistogram', 'LatencyRecorder', 'recorder')
+
+
+class LatencyHistogram:
+    """
+        A histogram of latencies in the style of HdrHistogram.
+
+        Values are recorded in microseconds into logarithmic buckets which
+          are each split into linear sub-buckets, so every recorded value is
+          kept to a fixed number of significant figures while memory stays
+          bounded no matter how many values are recorded.
+
+        Attributes:
+          count (int): Number of values recorded.
+          total (float): Sum of all values in seconds.
+          min (float): Smallest value in seconds.
+          max (float): Largest value in seconds.
+    """
+
+    PERCENTILES = (50, 90, 99, 99.9)
+
+    def __init__(self, significant_figures=2):
+        # Enough sub-buckets per power of two to tell apart values that
+        #   differ in the last significant figure
+        self.__sub_bucket_bits = math.ceil(
+            math.log2(2 * 10 ** significant_figures)
+        )
+        self.__counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def __bucket(self, microseconds):
+        shift = max(0, microseconds.bit_length() - self.__sub_bucket_bits)
+        return microseconds >> shift << shift
+
+    def record(self, seconds):
+        bucket = self.__bucket(max(0, int(seconds * 1000000)))
+        self.__counts[bucket] = self.__counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def merge(self, other):
+        """
+            Adds the values recorded by another histogram to this one.
+        """
+        for bucket, count in other.__counts.items():
+            bucket = self.__bucket(bucket)
+            self.__counts[bucket] = self.__counts.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percentile):
+        """
+            Returns:
+                float: The value in seconds below which the given percentage
+                  of recorded values fall or None if nothing was recorded.
+        """
+        if not self.count:
+            return None
+        target = max(1, math.ceil(self.count * percentile / 100))
+        seen = 0
+        for bucket in sorted(self.__counts):
+            seen += self.__counts[bucket]
+            if seen >= target:
+                return min(bucket / 1000000, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.total / self.count if self.count else None,
+            'percentiles': {
+                str(percentile): self.percentile(percentile)
+                for percentile in self.PERCENTILES
+            },
+            'buckets_us': sorted(self.__counts.items()),
+        }
+
+
+class LatencyRecorder:
+    """
+        Collects :class:`LatencyHistogram` per host, endpoint and phase for
+          requests watched by :class:`HttpApiMock` in WATCH mode.
+
+        Phases are 'headers', the time from sending a request until its
+          response headers have been read, and 'body', the time until the
+          response body has been completely read.
+
+        Attributes:
+          report_path (str): If set, a JSON report is written here when the
+            process exits. Defaults to the NETWORKTEST_LATENCY_REPORT
+            environment variable.
+    """
+
+    def __init__(self, report_path=None):
+        self.report_path = report_path
+        self.__histograms = {}
+        self.__lock = threading.Lock()
+
+    def record(self, host, endpoint, phase, seconds):
+        key = (host, endpoint, phase)
+        with self.__lock:
+            histogram = self.__histograms.get(key)
+            if histogram is None:
+                histogram = self.__histograms[key] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def get(self, host, endpoint, phase):
+        """
+            Returns:
+                LatencyHistogram: The histogram for a host, endpoint and
+                  phase or None if nothing has been recorded.
+        """
+        return self.__histograms.get((host, endpoint, phase))
+
+    def reset(self):
+        with self.__lock:
+            self.__histograms.clear()
+
+    def to_dict(self):
+        report = {}
+        with self.__lock:
+            for (host, endpoint, phase), histogram in sorted(
+                self.__histograms.items()
+            ):
+                report.setdefault(host, {}).setdefault(endpoint, {})[phase] = \
+                    histogram.to_dict()
+        return report
+
+    def export(self, path=None):
+        """
+            Writes a JSON report of all histograms to path or report_path.
+        """
+        path = path or self.report_path
+        if not path:
+            return
+        with open(path, 'w') as report:
+            json.dump(self.to_dict(), report, indent=2)
+
+
+recorder = LatencyRecorder(
+    report_path=os.environ.get('NETWORKTEST_LATENCY_REPORT')
+)
+
+
+@atexit.register
+def _export_at_exit():
+    if recorder.report_path and recorder.to_dict():
+        recorder.export()
@@ -0,0 +1,224 @@
+import _socket
+import itertools
+import os
+import shutil
+import socket
+import tempfile
+import threading
+from multiprocessing.connection import Connection
+from multiprocessing.util import Finalize
+
+from .._listener import Listener
+
+
+__all__ = ('SharedMockServer', 'SharedMockClient')
+
+
+# Message types. Messages are tuples that start with one of these.
+REQUEST = 0
+RECORDS = 1
+
+# Reply types. Replies are tuples of one of these and a value or exception.
+OK = 0
+ERROR = 1
+
+
+class SharedMockServer:
+    """
+        Serves requests that forked child processes forward to the
+          :class:`HttpApiMock` instances entered with shared=True in the
+          parent process.
+
+        Mocks are matched, and their call records kept, in the parent so
+          that tests can make assertions about work done by a process pool.
+          One server is started per process while shared mocks are active.
+          It listens on a unix socket in a private temporary directory.
+
+        Exceptions raised while handling a message, such as by an endpoint's
+          response, are sent back and raised again in the child instead of
+          closing its connection.
+
+        Sockets are created with _socket directly so that neither the server
+          nor its clients are affected by :class:`NetworkBlocker`.
+    """
+
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.__directory = tempfile.mkdtemp(prefix='networktest-')
+        self.address = os.path.join(self.__directory, 'mocks.sock')
+        self.__mocks = {}
+        self.__tokens = itertools.count(1)
+        self.__handle_lock = threading.Lock()
+        self.__listener = Listener(
+            socket.AF_UNIX,
+            self.address,
+            self.__handle,
+            name='networktest-shared-mocks'
+        )
+
+    @classmethod
+    def register(cls, mock):
+        """
+            Starts serving a mock, starting a server for this process if
+              needed.
+
+            Returns:
+                tuple: The server and a token that identifies the mock in
+                  messages from child processes.
+        """
+        with cls.__instance_lock:
+            if cls.__instance is None or cls.__instance.pid != os.getpid():
+                cls.__instance = cls()
+            server = cls.__instance
+            token = next(server.__tokens)
+            server.__mocks[token] = mock
+            return server, token
+
+    def unregister(self, token):
+        """
+            Stops serving a mock and stops the server if no mocks are left.
+        """
+        with self.__instance_lock:
+            self.__mocks.pop(token, None)
+            if not self.__mocks:
+                self.close()
+                if SharedMockServer.__instance is self:
+                    SharedMockServer.__instance = None
+
+    def close(self):
+        self.__listener.close()
+        shutil.rmtree(self.__directory, ignore_errors=True)
+
+    def __handle(self, sock):
+        with Connection(sock.detach()) as connection:
+            while True:
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    return
+
+                # Mocks aren't thread safe so only one message is handled
+                #   at a time
+                with self.__handle_lock:
+                    try:
+                        reply = (OK, self.__handle_message(message))
+                    except Exception as e:
+                        reply = (ERROR, e)
+
+                try:
+                    connection.send(reply)
+                except (EOFError, OSError):
+                    return
+                except Exception:
+                    # The exception couldn't be pickled
+                    connection.send((ERROR, RuntimeError(
+                        '%s: %s' % (type(reply[1]).__name__, reply[1])
+                    )))
+
+    def __handle_message(self, message):
+        if message[0] == REQUEST:
+            _, token, data = message
+            mock = self.__mocks.get(token)
+            if mock is None:
+                raise RuntimeError(
+                    'The shared mock %d is no longer active' % token
+                )
+            return mock._handle_shared_request(data)
+
+        for token, data in message[1]:
+            mock = self.__mocks.get(token)
+            if mock is not None:
+                mock._handle_shared_record(data)
+        return None
+
+
+class SharedMockClient:
+    """
+        Forwards requests from a forked child process to the
+          :class:`SharedMockServer` in its parent.
+
+        Requests that need a response are sent immediately. Records of
+          requests that are only being watched are sent in batches of
+          BATCH_SIZE and when the process exits. A client whose connection
+          fails is dropped so that the next request connects again.
+    """
+
+    BATCH_SIZE = 64
+
+    __clients = {}
+
+    def __init__(self, address):
+        sock = _socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address)
+        self.__connection = Connection(sock.detach())
+        self.closed = False
+        self.__records = []
+        self.__lock = threading.Lock()
+        # Finalizers with an exitpriority are run when a multiprocessing
+        #   child exits, unlike atexit handlers
+        Finalize(self, self.flush, exitpriority=100)
+
+    @classmethod
+    def connect(cls, server):
+        """
+            Returns:
+                SharedMockClient: The client for this process connected to
+                  server.
+        """
+        key = (os.getpid(), server.address)
+        client = cls.__clients.get(key)
+        if client is None or client.closed:
+            client = cls.__clients[key] = cls(server.address)
+        return client
+
+    def __send(self, message):
+        """
+            Sends a message and returns the value of the reply, raising any
+              exception the parent process sent back instead.
+        """
+        if self.closed:
+            raise ConnectionError('The shared mock connection is closed')
+        try:
+            self.__connection.send(message)
+            status, value = self.__connection.recv()
+        except (EOFError, OSError):
+            self.closed = True
+            self.__connection.close()
+            raise
+        if status == ERROR:
+            raise value
+        return value
+
+    def __flush(self):
+        if self.__records and not self.closed:
+            records, self.__records = self.__records, []
+            self.__send((RECORDS, records))
+
+    def flush(self):
+        """
+            Sends any batched records to the parent process.
+        """
+        with self.__lock:
+            self.__flush()
+
+    def request(self, token, data):
+        """
+            Returns:
+                bytes: The full HTTP response the parent's mock gives data.
+        """
+        with self.__lock:
+            # Keep records in order with requests
+            self.__flush()
+            return self.__send((REQUEST, token, data))
+
+    def record(self, token, data):
+        """
+            Batches a record of a watched request.
+        """
+        with self.__lock:
+            self.__records.append((token, data))
+            if len(self.__records) >= self.BATCH_SIZE:
+                self.__flush()
@@ -0,0 +1,350 @@
+from bisect import bisect_left, bisect_right, insort
+
+
+__all__ = ('ResourceStore',)
+
+
+def _copy_resource(value):
+    """
+        Returns a copy of a JSON-like value which shares nothing mutable
+          with it.
+    """
+    if isinstance(value, dict):
+        return {key: _copy_resource(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_resource(item) for item in value]
+    return value
+
+
+class ResourceStore:
+    """
+        An in-memory collection of resources (dicts) used by
+          :class:`HttpApiMockResource` to give mocks state.
+
+        Resources are indexed by id and by any declared index fields so that
+          lookups and filtered lists don't scan the whole collection. Lists
+          are paginated by offset or by cursor without copying the
+          collection. Values of index fields must be hashable.
+
+        Resources are copied when they are added and when they are
+          returned, so changing a returned resource never changes the store
+          or the stores copied from it. Stored resources are never modified
+          in place; update replaces a resource with an updated copy so seed
+          data may be safely shared between stores.
+
+        copy and reset share every collection with the other store. A
+          store only copies a collection the first time it changes it, so
+          stores that are only read cost nothing to copy or reset.
+
+        Attributes:
+          id_field (str): Key of the id in each resource.
+          indexes (tuple of strings): Keys of resources that are indexed
+            for filtering.
+    """
+
+    def __init__(self, id_field='id', indexes=(), id_factory=None):
+        """
+            Args:
+                id_field (str): Key of the id in each resource.
+                indexes (list of strings): Keys of resources that are indexed
+                    for filtering.
+                id_factory (function): Called to create an id for resources
+                    created without one. Defaults to incrementing integers.
+        """
+        self.id_field = id_field
+        self.indexes = tuple(indexes)
+
+        self.__id_factory = id_factory
+        self.__next_id = 1
+        self.__next_sequence = 0
+        self.__resources = {}
+        # Every resource gets an increasing sequence number. Sorted lists of
+        #   sequence numbers give a stable order for pagination that can be
+        #   resumed from a cursor with a binary search.
+        self.__sequence_by_id = {}
+        self.__id_by_sequence = {}
+        self.__order = []
+        self.__index = {field: {} for field in self.indexes}
+        self.__baseline = None
+        # Collections shared with another store which have to be copied
+        #   before they are changed. Resources, ids and order are copied
+        #   together, each field's index separately and the lists of
+        #   sequence numbers in an index that was copied one by one.
+        self.__shared = False
+        self.__shared_indexes = set()
+        # Values whose lists are owned by field, for indexes that were
+        #   copied from a shared index
+        self.__owned_lists = {}
+
+    def copy(self):
+        """
+            Returns:
+                ResourceStore: A store with the same resources which can be
+                  changed independently of this one. Collections are only
+                  copied once either store changes them.
+        """
+        store = ResourceStore(self.id_field, self.indexes, self.__id_factory)
+        store.__restore(self)
+        store.__baseline = self
+        return store
+
+    def __restore(self, other):
+        self.__next_id = other.__next_id
+        self.__next_sequence = other.__next_sequence
+        self.__resources = other.__resources
+        self.__sequence_by_id = other.__sequence_by_id
+        self.__id_by_sequence = other.__id_by_sequence
+        self.__order = other.__order
+        self.__index = dict(other.__index)
+        for store in (self, other):
+            store.__shared = True
+            store.__shared_indexes = set(store.indexes)
+
+    def __write(self):
+        """
+            Copies the resources, ids and order if they are shared.
+        """
+        if self.__shared:
+            self.__resources = self.__resources.copy()
+            self.__sequence_by_id = self.__sequence_by_id.copy()
+            self.__id_by_sequence = self.__id_by_sequence.copy()
+            self.__order = self.__order[:]
+            self.__shared = False
+
+    def __write_index(self, field, value):
+        """
+            Returns:
+                list: The sequence numbers indexed under value, copied
+                  first if they are shared.
+        """
+        index = self.__index[field]
+        if field in self.__shared_indexes:
+            index = self.__index[field] = index.copy()
+            self.__shared_indexes.discard(field)
+            self.__owned_lists[field] = set()
+        owned = self.__owned_lists.get(field)
+
+        sequences = index.get(value)
+        if sequences is None:
+            sequences = index[value] = []
+        elif owned is not None and value not in owned:
+            sequences = index[value] = sequences[:]
+        if owned is not None:
+            owned.add(value)
+        return sequences
+
+    def reset(self):
+        """
+            Restores the resources this store was copied from or removes
+              all resources if it wasn't copied.
+        """
+        if self.__baseline is None:
+            self.clear()
+        else:
+            self.__restore(self.__baseline)
+
+    def __new_id(self):
+        if self.__id_factory is not None:
+            return self.__id_factory()
+        resource_id = self.__next_id
+        self.__next_id += 1
+        return resource_id
+
+    def __len__(self):
+        return len(self.__resources)
+
+    def __contains__(self, resource_id):
+        return resource_id in self.__resources
+
+    def __iter__(self):
+        return map(_copy_resource, self.__resources.values())
+
+    def __add_to_index(self, resource, sequence):
+        for field in self.indexes:
+            if field in resource:
+                insort(self.__write_index(field, resource[field]), sequence)
+
+    def __remove_from_index(self, resource, sequence):
+        for field in self.indexes:
+            if field in resource:
+                value = resource[field]
+                sequences = self.__write_index(field, value)
+                del sequences[bisect_left(sequences, sequence)]
+                if not sequences:
+                    del self.__index[field][value]
+                    self.__owned_lists.get(field, set()).discard(value)
+
+    def seed(self, resources):
+        """
+            Adds many resources to the store.
+        """
+        for resource in resources:
+            self.create(resource)
+
+    def create(self, resource):
+        """
+            Adds a resource to the store, giving it an id if it doesn't
+              have one.
+
+            Returns:
+                dict: A copy of the stored resource.
+        """
+        resource = _copy_resource(resource)
+        if self.id_field not in resource:
+            resource_id = self.__new_id()
+            # Skip ids already used by seeded resources
+            while resource_id in self.__resources:
+                resource_id = self.__new_id()
+            resource[self.id_field] = resource_id
+        resource_id = resource[self.id_field]
+        if resource_id in self.__resources:
+            raise KeyError('Resource %r already exists' % (resource_id,))
+
+        self.__write()
+        sequence = self.__next_sequence
+        self.__next_sequence += 1
+        self.__resources[resource_id] = resource
+        self.__sequence_by_id[resource_id] = sequence
+        self.__id_by_sequence[sequence] = resource_id
+        self.__order.append(sequence)
+        self.__add_to_index(resource, sequence)
+        return _copy_resource(resource)
+
+    def get(self, resource_id):
+        """
+            Returns:
+                dict: A copy of the resource with the given id or None.
+        """
+        resource = self.__resources.get(resource_id)
+        return None if resource is None else _copy_resource(resource)
+
+    def update(self, resource_id, changes):
+        """
+            Replaces a resource with a copy that includes changes.
+
+            Returns:
+                dict: A copy of the updated resource or None if it doesn't
+                  exist.
+        """
+        resource = self.__resources.get(resource_id)
+        if resource is None:
+            return None
+
+        updated = dict(resource)
+        updated.update(_copy_resource(changes))
+        updated[self.id_field] = resource_id
+
+        self.__write()
+        sequence = self.__sequence_by_id[resource_id]
+        self.__remove_from_index(resource, sequence)
+        self.__resources[resource_id] = updated
+        self.__add_to_index(updated, sequence)
+        return _copy_resource(updated)
+
+    def delete(self, resource_id):
+        """
+            Removes a resource from the store.
+
+            Returns:
+                dict: The removed resource or None if it didn't exist.
+        """
+        if resource_id not in self.__resources:
+            return None
+
+        self.__write()
+        resource = self.__resources.pop(resource_id)
+        sequence = self.__sequence_by_id.pop(resource_id)
+        del self.__id_by_sequence[sequence]
+        del self.__order[bisect_left(self.__order, sequence)]
+        self.__remove_from_index(resource, sequence)
+        return _copy_resource(resource)
+
+    def clear(self):
+        """
+            Removes all resources from the store.
+        """
+        # Replaced rather than cleared as they may be shared
+        self.__resources = {}
+        self.__sequence_by_id = {}
+        self.__id_by_sequence = {}
+        self.__order = []
+        self.__index = {field: {} for field in self.indexes}
+        self.__shared = False
+        self.__shared_indexes = set()
+        self.__owned_lists = {}
+
+    def __candidates(self, filters):
+        """
+            Returns the smallest sorted list of sequence numbers that
+              contains every resource matching filters and the filters that
+              still need to be checked against each resource.
+        """
+        indexed = [field for field in self.indexes if field in filters]
+        if not indexed:
+            return self.__order, filters
+
+        field = min(
+            indexed,
+            key=lambda field: len(
+                self.__index[field].get(filters[field], ())
+            )
+        )
+        candidates = self.__index[field].get(filters[field], [])
+        remaining = {
+            other: value for other, value in filters.items()
+            if other != field
+        }
+        return candidates, remaining
+
+    def list(self, filters=None, offset=0, limit=None, cursor=None):
+        """
+            Lists resources in the order they were created.
+
+            Args:
+                filters (dict): Only include resources whose values for the
+                    given keys are equal to these.
+                offset (int): Number of matching resources to skip. Must not
+                    be negative.
+                limit (int): Maximum number of resources to return. Must be
+                    at least 1 so that following cursors always makes
+                    progress.
+                cursor (str): Continue from a cursor returned by a previous
+                    call.
+
+            Returns:
+                tuple: A list of copies of resources and a cursor for the
+                  next page or None if there are no more resources. Invalid
+                  arguments raise ValueError.
+        """
+        if offset < 0:
+            raise ValueError('offset must not be negative')
+        if limit is not None and limit < 1:
+            raise ValueError('limit must be at least 1')
+        candidates, remaining = self.__candidates(filters or {})
+
+        start = 0
+        if cursor is not None:
+            start = bisect_right(candidates, int(cursor))
+        if not remaining:
+            start += offset
+            offset = 0
+
+        resources = []
+        last_sequence = None
+        id_by_sequence = self.__id_by_sequence
+        for position in range(start, len(candidates)):
+            sequence = candidates[position]
+            resource = self.__resources[id_by_sequence[sequence]]
+            if remaining and any(
+                resource.get(field) != value
+                for field, value in remaining.items()
+            ):
+                continue
+            if offset:
+                offset -= 1
+                continue
+            if limit is not None and len(resources) == limit:
+                return resources, str(last_sequence)
+            resources.append(_copy_resource(resource))
+            last_sequence = sequence
+        return resources, None
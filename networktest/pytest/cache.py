@@ -0,0 +1,109 @@
+import heapq
+
+
+__all__ = ('NetworkCache',)
+
+
+class NetworkCache:
+    """
+        Records the network behavior of each test into pytest's cache so
+          that later runs know which tests touch the network without
+          running them first.
+
+        For each networked test the cache holds the number of blocked
+          socket attempts, allowed connections, the hosts whose HTTP
+          requests were mocked and how long the test took. Tests which ran
+          without touching the network are removed from it.
+
+        Attributes:
+          previous (dict): Records by node id from previous runs.
+          records (dict): Records by node id from this run.
+    """
+
+    KEY = 'networktest/usage'
+
+    def __init__(self, cache):
+        """
+            Args:
+                cache (pytest.Cache): pytest's cache or None if the
+                    cacheprovider plugin is disabled.
+        """
+        self.cache = cache
+        self.previous = cache.get(self.KEY, {}) if cache is not None else {}
+        self.records = {}
+        self.__durations = {}
+
+    @staticmethod
+    def networked(record):
+        """
+            Returns:
+                bool: True if a record shows any network activity.
+        """
+        return bool(
+            record.get('blocked') or
+            record.get('connections') or
+            record.get('mocked_hosts')
+        )
+
+    def record(self, nodeid, blocked=0, connections=0, mocked_hosts=()):
+        self.records[nodeid] = {
+            'blocked': blocked,
+            'connections': connections,
+            'mocked_hosts': sorted(mocked_hosts),
+        }
+
+    def record_duration(self, nodeid, duration):
+        self.__durations[nodeid] = duration
+
+    def newly_networked(self):
+        """
+            Returns:
+                list: Node ids of tests which touched the network in this
+                  run but not in previous runs.
+        """
+        return sorted(
+            nodeid for nodeid, record in self.records.items()
+            if self.networked(record) and nodeid not in self.previous
+        )
+
+    def save(self):
+        """
+            Merges this run's records into the cache. The cache is read
+              again first so that concurrent runs, such as xdist workers
+              sharing a cache directory, lose as little as possible.
+        """
+        if self.cache is None or not self.records:
+            return
+        saved = self.cache.get(self.KEY, {})
+        for nodeid, record in self.records.items():
+            if self.networked(record):
+                record = dict(record)
+                record['duration'] = self.__durations.get(nodeid, 0.0)
+                saved[nodeid] = record
+            else:
+                saved.pop(nodeid, None)
+        self.cache.set(self.KEY, saved)
+
+    def assign_groups(self, nodeids, groups):
+        """
+            Spreads the tests which were networked in previous runs over a
+              number of groups, longest first, always adding to the group
+              with the least total duration.
+
+            Returns:
+                dict: Group number by node id for previously networked tests.
+        """
+        networked = sorted(
+            (
+                (self.previous[nodeid].get('duration', 0.0), nodeid)
+                for nodeid in nodeids if nodeid in self.previous
+            ),
+            reverse=True
+        )
+        totals = [(0.0, group) for group in range(groups)]
+        assignments = {}
+        for duration, nodeid in networked:
+            total, group = heapq.heappop(totals)
+            assignments[nodeid] = group
+            heapq.heappush(totals, (total + duration, group))
+        return assignments
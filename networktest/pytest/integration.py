@@ -1,12 +1,15 @@
+import sys
+
+
 class PytestIntegration:
     capman = None
 
 
-try:
-    import pytest
-    # Removed in pytest 5.0
-    if hasattr(pytest, 'config'):
-        PytestIntegration.capman = \
-            pytest.config.pluginmanager.getplugin('capturemanager')
-except ImportError:
-    pass
+# pytest is never imported here so that networktest can be used (and
+#   imported quickly) without it. If it is already loaded and old enough
+#   to expose a global config, grab the capture manager from it.
+_pytest = sys.modules.get('pytest')
+# Removed in pytest 5.0
+if _pytest is not None and hasattr(_pytest, 'config'):
+    PytestIntegration.capman = \
+        _pytest.config.pluginmanager.getplugin('capturemanager')
@@ -1,31 +1,309 @@
+import sys
+from time import perf_counter
+
+import pytest
+
+from .cache import NetworkCache
 from .integration import PytestIntegration
-from ..blocker import (
-    NetworkBlocker,
-    PRESET_KWARGS_BLOCKED,
-    PRESET_KWARGS_LIMITED
-)
+
+
+WORST_OFFENDERS = 10
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('networktest')
+    group.addoption(
+        '--network-usage',
+        action='store_true',
+        default=False,
+        help='Record the network usage of tests marked networkblocked or '
+             'networklimited and report the worst offenders.'
+    )
+    group.addoption(
+        '--network-latency',
+        metavar='PATH',
+        default=None,
+        help='Write histograms of the latency of requests watched by '
+             'HttpApiMock in WATCH mode to PATH as JSON.'
+    )
+    group.addoption(
+        '--network-new',
+        action='store_true',
+        default=False,
+        help='Report tests which touched the network for the first time '
+             'according to the network cache.'
+    )
+    group.addoption(
+        '--network-only',
+        action='store_true',
+        default=False,
+        help='Only run tests which touched the network in previous runs. '
+             'Runs every test if nothing has been recorded yet.'
+    )
+    group.addoption(
+        '--network-groups',
+        metavar='K',
+        type=int,
+        default=0,
+        help='Spread tests which touched the network in previous runs over '
+             'K xdist_group groups, balanced by duration. Use with '
+             'pytest-xdist\'s --dist loadgroup.'
+    )
 
 
 def pytest_configure(config):
     PytestIntegration.capman = config.pluginmanager.getplugin('capturemanager')
+    # Kept as attributes, like item._blocker, as pytest.StashKey needs
+    #   pytest 7
+    config._network_usages = {}
+    config._network_cache = NetworkCache(getattr(config, 'cache', None))
+
+    config.addinivalue_line(
+        'markers',
+        'networkblocked(**budget): prevent all network requests. Accepts '
+        'max_connections, max_bytes_sent, max_bytes_received and '
+        'max_io_time to limit allowed network usage.'
+    )
+    config.addinivalue_line(
+        'markers',
+        'networklimited(**budget): prevent network requests except for '
+        'datastores. Accepts max_connections, max_bytes_sent, '
+        'max_bytes_received and max_io_time to limit datastore usage.'
+    )
+    config.addinivalue_line(
+        'markers',
+        'fake_redis(transport=\'in_process\', host=\'localhost\', '
+        'port=6379): configure the FakeRedis of the fake_redis fixture.'
+    )
+    if config.getoption('network_groups') and \
+            not config.pluginmanager.hasplugin('xdist'):
+        config.addinivalue_line(
+            'markers',
+            'xdist_group(name): run tests of a group on the same xdist '
+            'worker.'
+        )
+
+
+def pytest_unconfigure(config):
+    path = config.getoption('network_latency')
+    if path:
+        from ..mock.latency import recorder
+        recorder.export(path)
+
+
+def _get_nodeid(item):
+    """
+        Returns the node id of an item as it was collected, before
+          pytest-xdist's loadgroup suffixed it with @ and its group, so that
+          the network cache matches whether or not tests are grouped.
+    """
+    return getattr(item, '_network_nodeid', item.nodeid)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection_modifyitems(session, config, items):
+    # Runs before pytest-xdist's workers read xdist_group markers
+    for item in items:
+        item._network_nodeid = item.nodeid
+
+    cache = config._network_cache
+    if config.getoption('network_only') and cache.previous:
+        selected, deselected = [], []
+        for item in items:
+            if item.nodeid in cache.previous:
+                selected.append(item)
+            else:
+                deselected.append(item)
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = selected
+
+    groups = config.getoption('network_groups')
+    if groups:
+        assignments = cache.assign_groups(
+            [
+                item.nodeid for item in items
+                if item.get_closest_marker('xdist_group') is None
+            ],
+            groups
+        )
+        for item in items:
+            if item.nodeid in assignments:
+                item.add_marker(pytest.mark.xdist_group(
+                    'networktest-%d' % assignments[item.nodeid]
+                ))
+
+
+def _get_mocked_hosts():
+    """
+        Returns and clears the hosts mocked by HttpMockManager, without
+          importing it if no test has.
+    """
+    http = sys.modules.get('networktest.mock.http')
+    if http is None:
+        return set()
+    hosts = set(http.HttpMockManager.mocked_hosts)
+    http.HttpMockManager.mocked_hosts.clear()
+    return hosts
 
 
 def pytest_runtest_setup(item):
-    marks = (mark.name for mark in item.iter_markers())
-    marks = list(marks)
+    item._network_start = perf_counter()
+    _get_mocked_hosts()
+
+    mark = item.get_closest_marker('networkblocked') or \
+        item.get_closest_marker('networklimited')
+    if mark is None:
+        return
 
-    kwargs = None
-    if 'networkblocked' in marks:
+    # Only load the blocker once a test actually asks for it
+    from ..blocker import (
+        NetworkBlocker,
+        PRESET_KWARGS_BLOCKED,
+        PRESET_KWARGS_LIMITED
+    )
+    from ..usage import NetworkUsage
+
+    if mark.name == 'networkblocked':
         kwargs = PRESET_KWARGS_BLOCKED
-    elif 'networklimited' in marks:
+    else:
         kwargs = PRESET_KWARGS_LIMITED
 
-    if kwargs:
-        item._blocker = NetworkBlocker(**kwargs)
-        item._blocker.__enter__()
+    usage = None
+    if mark.kwargs or item.config.getoption('network_usage'):
+        usage = NetworkUsage()
+        # Raise unknown budgets before the test runs
+        usage.exceeded(**mark.kwargs)
+        item.config._network_usages[_get_nodeid(item)] = usage
+        item._network_budget = mark.kwargs
+
+    item._blocker = NetworkBlocker(usage=usage, **kwargs)
+    item._blocker.__enter__()
 
 
+@pytest.hookimpl(trylast=True)
+def pytest_runtest_call(item):
+    """
+        Fails a test which passed but exceeded its network budget.
+    """
+    budget = getattr(item, '_network_budget', None)
+    if budget:
+        exceeded = item._blocker.usage.exceeded(**budget)
+        if exceeded:
+            pytest.fail(
+                'Network budget exceeded: %s' % ', '.join(exceeded),
+                pytrace=False
+            )
+
+
+@pytest.hookimpl(hookwrapper=True)
 def pytest_runtest_teardown(item):
+    # Fixtures may have patched sockets after the blocker did so it is only
+    #   exited once they have been torn down
+    yield
+    blocked = connections = 0
     if hasattr(item, '_blocker'):
         item._blocker.__exit__(None, None, None)
+        blocked = item._blocker.violations
+        connections = item._blocker.allowed
+        if item._blocker.usage is not None:
+            connections = item._blocker.usage.connections
         del item._blocker
+    nodeid = _get_nodeid(item)
+    cache = item.config._network_cache
+    cache.record(nodeid, blocked, connections, _get_mocked_hosts())
+    start = getattr(item, '_network_start', None)
+    if start is not None:
+        cache.record_duration(nodeid, perf_counter() - start)
+
+
+@pytest.fixture(scope='session')
+def http_api_mock_session():
+    """
+        An HttpApiMockSession which keeps mocks for the whole session.
+    """
+    from ..mock.api import HttpApiMockSession
+
+    with HttpApiMockSession() as session:
+        yield session
+
+
+@pytest.fixture
+def http_api_mock(http_api_mock_session):
+    """
+        Enters a reset HttpApiMock for one test, creating it only once per
+          session. Call with the mock class and any arguments for it:
+          http_api_mock(MyApiMock, mode=MyApiMock.Modes.WATCH).
+    """
+    yield http_api_mock_session.enter
+    http_api_mock_session.exit_all()
+
+
+@pytest.fixture(scope='session')
+def _networktest_fake_servers():
+    servers = {}
+    yield servers
+    for server in servers.values():
+        if server.transport == server.Transports.LOOPBACK:
+            server.stop()
+
+
+@pytest.fixture
+def fake_redis(request, _networktest_fake_servers):
+    """
+        A reset FakeRedis for one test. Configured with the fake_redis
+          marker, it serves localhost:6379 in-process by default. Servers
+          are only created once per session.
+    """
+    from ..fakes.redis import FakeRedis
+
+    mark = request.node.get_closest_marker('fake_redis')
+    kwargs = dict(mark.kwargs) if mark else {}
+    transport = kwargs.get('transport')
+    if isinstance(transport, str):
+        kwargs['transport'] = FakeRedis.Transports[transport.upper()]
+
+    key = (FakeRedis, tuple(sorted(kwargs.items())))
+    server = _networktest_fake_servers.get(key)
+    if server is None:
+        server = _networktest_fake_servers[key] = FakeRedis(**kwargs)
+        if server.transport == server.Transports.LOOPBACK:
+            server.start()
+    server.reset()
+
+    if server.transport == server.Transports.LOOPBACK:
+        yield server
+    else:
+        with server:
+            yield server
+
+
+def pytest_sessionfinish(session):
+    session.config._network_cache.save()
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    if config.getoption('network_new'):
+        newly_networked = config._network_cache.newly_networked()
+        if newly_networked:
+            terminalreporter.write_sep('=', 'newly networked tests')
+            for nodeid in newly_networked:
+                terminalreporter.write_line(nodeid)
+
+    usages = config._network_usages
+    if not usages or not config.getoption('network_usage'):
+        return
+
+    terminalreporter.write_sep('=', 'network usage (worst offenders)')
+    worst = sorted(
+        usages.items(),
+        key=lambda item: (item[1].io_time, item[1].connections),
+        reverse=True
+    )[:WORST_OFFENDERS]
+    for nodeid, usage in worst:
+        terminalreporter.write_line(
+            '%8.3fs %4d connections %10d sent %10d received  %s' % (
+                usage.io_time, usage.connections,
+                usage.bytes_sent, usage.bytes_received, nodeid
+            )
+        )
@@ -0,0 +1,141 @@
+import errno
+import io
+import os
+import socket
+
+
+__all__ = ('SimulatedSocket',)
+
+
+class SimulatedSocket:
+    """
+        A lightweight stand-in for socket.socket that never allocates a file
+          descriptor or touches the network.
+
+        Returned by :class:`NetworkBlocker` in SIMULATE mode so that code
+          which opens unwanted connections keeps running without paying for
+          connection timeouts or exhausting file descriptors.
+
+        Attributes:
+          connect_errno (int): errno raised by connect. If None connections
+            succeed and all traffic sent is discarded.
+    """
+
+    def __init__(
+        self,
+        family=socket.AF_INET,
+        type=socket.SOCK_STREAM,
+        proto=0,
+        fileno=None,
+        connect_errno=errno.ECONNREFUSED
+    ):
+        # socket.socket uses -1 to mean "use the default"
+        self.family = socket.AF_INET if family == -1 else family
+        self.type = socket.SOCK_STREAM if type == -1 else type
+        self.proto = 0 if proto == -1 else proto
+        self.connect_errno = connect_errno
+
+        self._timeout = socket.getdefaulttimeout()
+        self._peer = None
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return '<SimulatedSocket family=%s type=%s peer=%r>' % (
+            self.family, self.type, self._peer
+        )
+
+    def _check_open(self):
+        if self._closed:
+            raise OSError(errno.EBADF, os.strerror(errno.EBADF))
+
+    def connect(self, address):
+        self._check_open()
+        if self.connect_errno is not None:
+            raise OSError(self.connect_errno, os.strerror(self.connect_errno))
+        self._peer = address
+
+    def connect_ex(self, address):
+        try:
+            self.connect(address)
+        except OSError as e:
+            return e.errno
+        return 0
+
+    def send(self, data, flags=0):
+        self._check_open()
+        return len(data)
+
+    def sendall(self, data, flags=0):
+        self.send(data, flags)
+
+    def sendto(self, data, *args):
+        self._check_open()
+        return len(data)
+
+    def recv(self, bufsize, flags=0):
+        self._check_open()
+        return b''
+
+    def recv_into(self, buffer, nbytes=0, flags=0):
+        self._check_open()
+        return 0
+
+    def recvfrom(self, bufsize, flags=0):
+        return self.recv(bufsize, flags), self._peer
+
+    def makefile(self, *args, **kwargs):
+        self._check_open()
+        return io.BytesIO()
+
+    def getpeername(self):
+        if self._peer is None:
+            raise OSError(errno.ENOTCONN, os.strerror(errno.ENOTCONN))
+        return self._peer
+
+    def getsockname(self):
+        if self.family == socket.AF_INET6:
+            return ('::', 0, 0, 0)
+        return ('0.0.0.0', 0)
+
+    def bind(self, address):
+        self._check_open()
+
+    def listen(self, backlog=0):
+        self._check_open()
+
+    def settimeout(self, value):
+        self._timeout = value
+
+    def gettimeout(self):
+        return self._timeout
+
+    def setblocking(self, flag):
+        self._timeout = None if flag else 0.0
+
+    def getblocking(self):
+        return self._timeout != 0.0
+
+    def setsockopt(self, *args):
+        pass
+
+    def getsockopt(self, *args):
+        return 0
+
+    def fileno(self):
+        return -1
+
+    def shutdown(self, how):
+        self._check_open()
+
+    def detach(self):
+        self._closed = True
+        return -1
+
+    def close(self):
+        self._closed = True
@@ -25,6 +25,68 @@ class NetworkBlockerTest(unittest.TestCase):
         self._blocker = None
 
 
+class NetworkBlockerClassTest(unittest.TestCase):
+    """
+        Enters a single NetworkBlocker for all tests in a class rather than
+          one per test. Each test starts with the policy from
+          blocker_kwargs, which may be overridden per test by setting it
+          before calling super().setUp() or changed during a test with
+          self._blocker.configure().
+    """
+
+    _blocker = None
+    blocker_kwargs = {}
+
+    @classmethod
+    def _get_blocker_kwargs(cls, blocker_kwargs):
+        return blocker_kwargs
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls._blocker = NetworkBlocker(
+            **cls._get_blocker_kwargs(cls.blocker_kwargs)
+        )
+        cls._blocker.__enter__()
+        cls.addClassCleanup(cls._exit_blocker)
+
+    @classmethod
+    def _exit_blocker(cls):
+        cls._blocker.__exit__(None, None, None)
+        cls._blocker = None
+
+    def setUp(self):
+        super().setUp()
+
+        # Undo any changes made by a previous test
+        self._blocker.configure(
+            **self._get_blocker_kwargs(self.blocker_kwargs)
+        )
+
+
+class NetworkBlockerAsyncTest(
+    NetworkBlockerClassTest,
+    unittest.IsolatedAsyncioTestCase
+):
+    """
+        NetworkBlockerClassTest for coroutine tests. The event loop created
+          for every test is allowed to create the socket pair it uses to
+          wake itself up, while connections made on the loop are still
+          blocked.
+    """
+
+    EVENT_LOOP_MODULES = ['socket.socketpair']
+
+    @classmethod
+    def _get_blocker_kwargs(cls, blocker_kwargs):
+        blocker_kwargs = dict(blocker_kwargs)
+        blocker_kwargs['allowed_modules'] = \
+            list(blocker_kwargs.get('allowed_modules') or ()) + \
+            cls.EVENT_LOOP_MODULES
+        return blocker_kwargs
+
+
 class NetworkBlockedTest(NetworkBlockerTest):
     """
         TestCase that prevents all network requests.
@@ -49,4 +111,42 @@ class NetworkLimitedTest(NetworkBlockerTest):
     blocker_kwargs = PRESET_KWARGS_LIMITED
 
 
-__all__ = ('NetworkBlockedTest', 'NetworkLimitedTest')
+class NetworkBlockedClassTest(NetworkBlockerClassTest):
+    """
+        NetworkBlockedTest that enters a NetworkBlocker once per class.
+    """
+
+    blocker_kwargs = PRESET_KWARGS_BLOCKED
+
+
+class NetworkLimitedClassTest(NetworkBlockerClassTest):
+    """
+        NetworkLimitedTest that enters a NetworkBlocker once per class.
+    """
+
+    blocker_kwargs = PRESET_KWARGS_LIMITED
+
+
+class NetworkBlockedAsyncTest(NetworkBlockerAsyncTest):
+    """
+        IsolatedAsyncioTestCase that prevents all network requests.
+    """
+
+    blocker_kwargs = PRESET_KWARGS_BLOCKED
+
+
+class NetworkLimitedAsyncTest(NetworkBlockerAsyncTest):
+    """
+        IsolatedAsyncioTestCase that prevents network requests except for
+          those made by packages commonly used for core functionality in an
+          API (such as querying a database).
+    """
+
+    blocker_kwargs = PRESET_KWARGS_LIMITED
+
+
+__all__ = (
+    'NetworkBlockedTest', 'NetworkLimitedTest',
+    'NetworkBlockedClassTest', 'NetworkLimitedClassTest',
+    'NetworkBlockedAsyncTest', 'NetworkLimitedAsyncTest'
+)
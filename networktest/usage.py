@@ -0,0 +1,157 @@
+import socket
+from time import perf_counter
+
+
+__all__ = ('NetworkUsage', 'AccountedSocket')
+
+
+class NetworkUsage:
+    """
+        Accumulates network activity of the sockets a :class:`NetworkBlocker`
+          allows, such as connections made by datastore clients.
+
+        Attributes:
+          connections (int): Number of connection attempts.
+          bytes_sent (int): Number of bytes sent.
+          bytes_received (int): Number of bytes received.
+          io_time (float): Seconds spent blocked in socket calls.
+    """
+
+    BUDGETS = {
+        'max_connections': 'connections',
+        'max_bytes_sent': 'bytes_sent',
+        'max_bytes_received': 'bytes_received',
+        'max_io_time': 'io_time',
+    }
+
+    def __init__(self):
+        self.connections = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.io_time = 0.0
+
+    def __repr__(self):
+        return (
+            '<NetworkUsage connections=%d bytes_sent=%d bytes_received=%d '
+            'io_time=%.3fs>' % (
+                self.connections, self.bytes_sent,
+                self.bytes_received, self.io_time
+            )
+        )
+
+    def exceeded(self, **budget):
+        """
+            Returns a list of messages describing which limits of a budget
+              have been exceeded.
+
+            Args:
+                budget: Any of max_connections, max_bytes_sent,
+                    max_bytes_received and max_io_time.
+        """
+        messages = []
+        for limit, value in budget.items():
+            try:
+                attribute = self.BUDGETS[limit]
+            except KeyError:
+                raise TypeError('Unknown network budget %r' % limit) from None
+            used = getattr(self, attribute)
+            if value is not None and used > value:
+                messages.append('%s %s > %s' % (attribute, used, value))
+        return messages
+
+
+class AccountedSocket(socket.socket):
+    """
+        socket.socket that records its activity into a :class:`NetworkUsage`.
+
+        Bytes sent or received after the socket has been wrapped by ssl
+          are not counted because ssl takes over the file descriptor.
+    """
+
+    @classmethod
+    def wrap(cls, sock, usage):
+        """
+            Returns an AccountedSocket that takes over the file descriptor of
+              sock.
+        """
+        accounted = cls(sock.family, sock.type, sock.proto, sock.detach())
+        accounted.usage = usage
+        return accounted
+
+    def connect(self, address):
+        start = perf_counter()
+        try:
+            return super().connect(address)
+        finally:
+            self.usage.connections += 1
+            self.usage.io_time += perf_counter() - start
+
+    def connect_ex(self, address):
+        start = perf_counter()
+        try:
+            return super().connect_ex(address)
+        finally:
+            self.usage.connections += 1
+            self.usage.io_time += perf_counter() - start
+
+    def send(self, data, *args):
+        start = perf_counter()
+        try:
+            sent = super().send(data, *args)
+        finally:
+            self.usage.io_time += perf_counter() - start
+        self.usage.bytes_sent += sent
+        return sent
+
+    def sendall(self, data, *args):
+        start = perf_counter()
+        try:
+            super().sendall(data, *args)
+        finally:
+            self.usage.io_time += perf_counter() - start
+        self.usage.bytes_sent += memoryview(data).nbytes
+
+    def sendto(self, data, *args):
+        start = perf_counter()
+        try:
+            sent = super().sendto(data, *args)
+        finally:
+            self.usage.io_time += perf_counter() - start
+        self.usage.bytes_sent += sent
+        return sent
+
+    def recv(self, *args):
+        start = perf_counter()
+        try:
+            data = super().recv(*args)
+        finally:
+            self.usage.io_time += perf_counter() - start
+        self.usage.bytes_received += len(data)
+        return data
+
+    def recv_into(self, *args):
+        start = perf_counter()
+        try:
+            received = super().recv_into(*args)
+        finally:
+            self.usage.io_time += perf_counter() - start
+        self.usage.bytes_received += received
+        return received
+
+    def recvfrom(self, *args):
+        start = perf_counter()
+        try:
+            data, address = super().recvfrom(*args)
+        finally:
+            self.usage.io_time += perf_counter() - start
+        self.usage.bytes_received += len(data)
+        return data, address
+
+    def recvfrom_into(self, *args):
+        start = perf_counter()
+        try:
+            received, address = super().recvfrom_into(*args)
+        finally:
+            self.usage.io_time += perf_counter() - start
+        self.usage.bytes_received += received
+        return received, address
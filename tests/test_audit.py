@@ -0,0 +1,133 @@
+import json
+import logging
+import socket
+import time
+
+from networktest import EgressAuditor, NetworkBlocker
+
+
+def send():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.sendto(b'test', ('127.0.0.1', 9))
+    sock.close()
+
+
+def connect():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.connect(('127.0.0.1', 9))
+    sock.close()
+
+
+def test_mode_audit(tmp_path):
+    path = str(tmp_path / 'audit.jsonl')
+    auditor = EgressAuditor(path=path, sample_rate=1)
+    with NetworkBlocker(mode=NetworkBlocker.Modes.AUDIT, auditor=auditor):
+        for _ in range(3):
+            send()
+        connect()
+
+    with open(path) as audit_file:
+        records = sorted(
+            (json.loads(line) for line in audit_file),
+            key=lambda record: record['call_site'].split()[1]
+        )
+    assert [record['call_site'].split()[1] for record in records] == [
+        'connect', 'send'
+    ]
+    assert [record['sockets'] for record in records] == [1, 3]
+    assert records[1]['destinations'] == {'127.0.0.1:9': 3}
+    assert 'in send' in records[1]['stack'][-1]
+
+
+def test_audit_limits(caplog):
+    auditor = EgressAuditor(
+        max_call_sites=1,
+        max_destinations=1,
+        max_log_rate=0.001
+    )
+    with caplog.at_level(logging.INFO, logger='networktest.audit'):
+        with NetworkBlocker(mode=NetworkBlocker.Modes.AUDIT, auditor=auditor):
+            send()
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.sendto(b'test', ('127.0.0.1', 9))
+            sock.sendto(b'test', ('127.0.0.2', 9))
+            sock.close()
+
+    warnings = [
+        record for record in caplog.records
+        if record.levelno == logging.WARNING
+    ]
+    assert len(warnings) == 1
+    records = [
+        json.loads(record.getMessage()) for record in caplog.records
+        if record.levelno == logging.INFO
+    ]
+    assert len(records) == 2
+    overflow = records[1]
+    assert overflow['call_site'] == '<overflow>'
+    assert overflow['sockets'] == 1
+    assert overflow['destinations'] == {'127.0.0.1:9': 1, '<overflow>': 1}
+    assert 'stack' not in overflow
+
+
+def test_audit_allowed(tmp_path):
+    path = tmp_path / 'audit.jsonl'
+    auditor = EgressAuditor(path=str(path))
+    with NetworkBlocker(
+        mode=NetworkBlocker.Modes.AUDIT,
+        auditor=auditor,
+        allowed_modules=[__name__ + '.send']
+    ):
+        send()
+        connect()
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record['call_site'].split()[1] for record in records] == [
+        'connect'
+    ]
+
+
+def test_audit_accepted_sockets(tmp_path):
+    path = tmp_path / 'audit.jsonl'
+    auditor = EgressAuditor(path=str(path), sample_rate=1)
+    server = socket.create_server(('127.0.0.1', 0))
+    client = socket.create_connection(server.getsockname())
+    try:
+        with NetworkBlocker(
+            mode=NetworkBlocker.Modes.AUDIT,
+            auditor=auditor
+        ):
+            connection, _ = server.accept()
+            connection.close()
+            first, second = socket.socketpair()
+            first.dup().close()
+            first.close()
+            second.close()
+    finally:
+        client.close()
+        server.close()
+    assert not path.exists() or path.read_text() == ''
+
+
+def test_audit_logged_call_sites_are_bounded(caplog):
+    auditor = EgressAuditor(max_call_sites=1, max_log_rate=100)
+    with caplog.at_level(logging.WARNING, logger='networktest.audit'):
+        with NetworkBlocker(mode=NetworkBlocker.Modes.AUDIT, auditor=auditor):
+            send()
+            time.sleep(0.02)
+            connect()
+            assert len(caplog.records) == 1
+            auditor.collect()
+            time.sleep(0.02)
+            connect()
+    assert len(caplog.records) == 2
+    assert caplog.records[1].getMessage().endswith(' connect')
+
+
+def test_audit_stack_belongs_to_its_flush():
+    auditor = EgressAuditor(sample_rate=1)
+    with NetworkBlocker(mode=NetworkBlocker.Modes.AUDIT, auditor=auditor):
+        send()
+        records = auditor.collect()
+        assert 'in send' in records[0]['stack'][-1]
+        connect()
+        assert 'in connect' in auditor.collect()[0]['stack'][-1]
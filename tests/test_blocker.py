@@ -1,7 +1,15 @@
+import _socket
+import asyncio
+import errno
+import os
 import socket
-from pytest import fail
+import sys
+from pytest import fail, raises, warns
 
-from networktest import NetworkBlocker, NetworkBlockException
+from networktest import (
+    NetworkBlocker, NetworkBlockException, NetworkUsage, SimulatedSocket
+)
+from networktest.matcher import CallSiteMatcher
 from networktest.pytest.integration import PytestIntegration
 
 
@@ -43,3 +51,242 @@ def test_mode_disabled(capsys):
         send()
     err = capsys.readouterr().err
     assert len(err) == 0
+
+
+def test_mode_simulate(capsys):
+    capman = PytestIntegration.capman
+    PytestIntegration.capman = None
+    try:
+        with NetworkBlocker(mode=NetworkBlocker.Modes.SIMULATE):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            assert isinstance(sock, SimulatedSocket)
+            assert sock.fileno() == -1
+            try:
+                sock.connect(('127.0.0.1', 80))
+                fail('Should fail')
+            except ConnectionRefusedError:
+                pass
+        err = capsys.readouterr().err
+        assert len(err) > 0
+    finally:
+        PytestIntegration.capman = capman
+
+
+def test_mode_simulate_errno():
+    with NetworkBlocker(
+        mode=NetworkBlocker.Modes.SIMULATE,
+        simulate_errno=errno.ETIMEDOUT
+    ):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        assert sock.connect_ex(('127.0.0.1', 80)) == errno.ETIMEDOUT
+
+
+def test_mode_simulate_discard():
+    with NetworkBlocker(
+        mode=NetworkBlocker.Modes.SIMULATE,
+        simulate_errno=None
+    ):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.connect(('127.0.0.1', 80))
+            assert sock.sendall(b'test') is None
+            assert sock.recv(1024) == b''
+        send()
+
+
+def test_mode_simulate_existing_sockets():
+    with NetworkBlocker(mode=NetworkBlocker.Modes.SIMULATE):
+        left, right = socket.socketpair()
+        with left, right:
+            assert not isinstance(left, SimulatedSocket)
+            assert left.fileno() != -1
+            left.sendall(b'test')
+            assert right.recv(4) == b'test'
+            with left.dup() as duplicate:
+                assert duplicate.fileno() != -1
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(asyncio.sleep(0))
+        loop.close()
+
+        assert isinstance(socket.socket(), SimulatedSocket)
+
+
+class Cache:
+
+    def get(self):
+        socket.socket(socket.AF_INET, socket.SOCK_DGRAM).close()
+
+
+class Client:
+
+    def fetch(self):
+        socket.socket(socket.AF_INET, socket.SOCK_DGRAM).close()
+
+    def cached_fetch(self):
+        Cache().get()
+
+    def fetch_udp(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.sendto(b'test', ('127.0.0.1', 80))
+        sock.close()
+
+
+def test_allowed_modules():
+    with NetworkBlocker(allowed_modules=[__name__ + '.Cache.*']):
+        Cache().get()
+        try:
+            Client().fetch()
+            fail('Should fail')
+        except NetworkBlockException:
+            pass
+
+
+def test_denied_modules():
+    with NetworkBlocker(
+        allowed_modules=[__name__ + '.*'],
+        denied_modules=[__name__ + '.Client.fetch']
+    ):
+        send()
+        Client().cached_fetch()
+        try:
+            Client().fetch()
+            fail('Should fail')
+        except NetworkBlockException:
+            pass
+
+
+def test_allowed_packages_follow_sys_path(monkeypatch):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    blocker = NetworkBlocker(allowed_packages=['tests'])
+    monkeypatch.setattr(sys, 'path', [p for p in sys.path if p != root])
+    with blocker:
+        with raises(NetworkBlockException):
+            send()
+        sys.path.append(root)
+        send()
+
+
+def test_stack_allowed_is_deprecated():
+    import traceback
+    stack = traceback.extract_stack()
+    blocker = NetworkBlocker(allowed_packages=['tests'])
+    with warns(DeprecationWarning):
+        assert blocker.stack_allowed(stack) == any(
+            '/tests/' in frame.filename and
+            frame.filename[:frame.filename.find('/tests/')] in sys.path
+            for frame in stack
+        )
+    with warns(DeprecationWarning):
+        assert not NetworkBlocker().stack_allowed(stack)
+
+
+def test_matchers_are_bounded():
+    first = CallSiteMatcher.for_rules(['module0'])
+    assert CallSiteMatcher.for_rules(['module0']) is first
+    for i in range(1, CallSiteMatcher.MAX_MATCHERS + 1):
+        CallSiteMatcher.for_rules(['module%d' % i])
+    assert CallSiteMatcher.for_rules(['module0']) is not first
+
+
+AUDIT_HOOK = NetworkBlocker.Backends.AUDIT_HOOK
+
+
+def test_audit_hook_strict():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    raw = _socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        with NetworkBlocker(backend=AUDIT_HOOK):
+            assert socket.socket is not NetworkBlocker.replacement_socket
+            # Sockets created before entering and through _socket are
+            #   caught when they are used
+            with raises(NetworkBlockException):
+                sock.connect(('127.0.0.1', 80))
+            with raises(NetworkBlockException):
+                raw.sendto(b'test', ('127.0.0.1', 80))
+            with raises(NetworkBlockException):
+                socket.getaddrinfo('example.com', 80)
+            socket.getaddrinfo('localhost', 80)
+            socket.getaddrinfo('127.0.0.1', 80)
+        sock.connect(('127.0.0.1', 80))
+    finally:
+        sock.close()
+        raw.close()
+
+
+def test_audit_hook_unix_sockets():
+    with NetworkBlocker(backend=AUDIT_HOOK):
+        left, right = socket.socketpair()
+        left.close()
+        right.close()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        with raises(FileNotFoundError):
+            sock.connect('/nonexistent/networktest.sock')
+        sock.close()
+
+
+def test_audit_hook_allowed_modules():
+    blocker = NetworkBlocker(
+        backend=AUDIT_HOOK,
+        allowed_modules=[__name__ + '.send']
+    )
+    with blocker:
+        send()
+        with raises(NetworkBlockException):
+            Client().fetch_udp()
+    assert blocker.violations == 1
+
+
+def test_audit_hook_simulate(capsys):
+    capman = PytestIntegration.capman
+    PytestIntegration.capman = None
+    try:
+        with NetworkBlocker(
+            mode=NetworkBlocker.Modes.SIMULATE,
+            backend=AUDIT_HOOK
+        ):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            with raises(ConnectionRefusedError):
+                sock.connect(('127.0.0.1', 80))
+            sock.close()
+        assert len(capsys.readouterr().err) > 0
+    finally:
+        PytestIntegration.capman = capman
+
+
+def test_configure_backend():
+    blocker = NetworkBlocker()
+    with blocker:
+        assert socket.socket == blocker.replacement_socket
+        blocker.configure(backend=AUDIT_HOOK)
+        assert socket.socket is not blocker.replacement_socket
+        with raises(NetworkBlockException):
+            send()
+    with raises(ConnectionRefusedError):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.connect(('127.0.0.1', 9))
+        finally:
+            sock.close()
+
+
+def test_configure_keeps_state():
+    usage = NetworkUsage()
+    blocker = NetworkBlocker(mode=NetworkBlocker.Modes.AUDIT, usage=usage)
+    auditor = blocker.auditor
+    with blocker:
+        blocker.configure(mode=NetworkBlocker.Modes.AUDIT)
+        assert blocker.auditor is auditor
+        assert blocker.usage is usage
+
+        blocker.configure()
+        with raises(NetworkBlockException):
+            send()
+        blocker.configure()
+        assert blocker.violations == 1
+        assert blocker.auditor is auditor
+
+        other = NetworkUsage()
+        blocker.configure(allowed_modules=[__name__ + '.send'], usage=other)
+        send()
+        assert blocker.usage is other
+        assert other.bytes_sent == 4
@@ -1,10 +1,15 @@
+import asyncio
 import socket
 from pytest import fail
 
 from networktest import (
     NetworkBlockException,
     NetworkBlockedTest,
-    NetworkLimitedTest
+    NetworkLimitedTest,
+    NetworkBlockedClassTest,
+    NetworkLimitedClassTest,
+    NetworkBlockedAsyncTest,
+    NetworkLimitedAsyncTest
 )
 
 
@@ -31,3 +36,58 @@ class TestLimitedCase(NetworkLimitedTest):
             fail('Should fail')
         except NetworkBlockException:
             pass
+
+
+class TestBlockedClassCase(NetworkBlockedClassTest):
+
+    def test_case(self):
+        try:
+            send()
+            fail('Should fail')
+        except NetworkBlockException:
+            pass
+
+    def test_configure(self):
+        blocker = self._blocker
+        self._blocker.configure(allowed_modules=[__name__ + '.send'])
+        send()
+        assert self._blocker is blocker
+
+
+class TestLimitedClassCase(NetworkLimitedClassTest):
+
+    def test_case(self):
+        try:
+            send()
+            fail('Should fail')
+        except NetworkBlockException:
+            pass
+
+
+class TestBlockedAsyncCase(NetworkBlockedAsyncTest):
+
+    async def test_case(self):
+        try:
+            send()
+            fail('Should fail')
+        except NetworkBlockException:
+            pass
+
+    async def test_loop_connection(self):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.create_connection(asyncio.Protocol, '127.0.0.1', 80)
+            fail('Should fail')
+        except NetworkBlockException:
+            pass
+
+
+class TestLimitedAsyncCase(NetworkLimitedAsyncTest):
+
+    async def test_case(self):
+        await asyncio.sleep(0)
+        try:
+            send()
+            fail('Should fail')
+        except NetworkBlockException:
+            pass
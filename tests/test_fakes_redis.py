@@ -0,0 +1,172 @@
+import socket
+from pytest import fixture, importorskip, mark, raises
+
+from networktest import NetworkBlocker, NetworkBlockException
+from networktest.fakes import FakeRedis
+
+
+def command(*args):
+    return b'*%d\r\n' % len(args) + b''.join(
+        b'$%d\r\n%s\r\n' % (len(arg), arg)
+        for arg in (
+            arg if isinstance(arg, bytes) else str(arg).encode()
+            for arg in args
+        )
+    )
+
+
+class Client:
+
+    def __init__(self, address):
+        self.sock = socket.create_connection(address, timeout=1)
+        self.file = self.sock.makefile('rb')
+
+    def read(self):
+        line = self.file.readline()[:-2]
+        kind, value = line[:1], line[1:]
+        if kind in (b'+', b'-'):
+            return value.decode()
+        if kind == b':':
+            return int(value)
+        if kind == b'$':
+            if value == b'-1':
+                return None
+            return self.file.read(int(value) + 2)[:-2]
+        return [self.read() for _ in range(int(value))]
+
+    def __call__(self, *args):
+        self.sock.sendall(command(*args))
+        return self.read()
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+@fixture(params=list(FakeRedis.Transports))
+def redis(request):
+    with FakeRedis(transport=request.param, port=6390) as server:
+        client = Client(server.address)
+        yield client
+        client.close()
+
+
+def test_strings(redis):
+    assert redis('PING') == 'PONG'
+    assert redis('GET', 'missing') is None
+    assert redis('SET', 'key', 'value') == 'OK'
+    assert redis('GET', 'key') == b'value'
+    assert redis('SET', 'key', 'other', 'NX') is None
+    assert redis('INCR', 'counter') == 1
+    assert redis('INCRBY', 'counter', 5) == 6
+    assert redis('INCR', 'key').startswith('ERR value is not an integer')
+    assert redis('MGET', 'key', 'counter', 'missing') == [
+        b'value', b'6', None
+    ]
+    assert redis('DEL', 'key', 'counter', 'missing') == 2
+    assert redis('EXISTS', 'key') == 0
+
+
+def test_expiry(redis):
+    redis('SET', 'key', 'value', 'PX', 10000)
+    assert 0 < redis('PTTL', 'key') <= 10000
+    assert redis('PERSIST', 'key') == 1
+    assert redis('TTL', 'key') == -1
+    assert redis('EXPIRE', 'key', 0) == 1
+    assert redis('GET', 'key') is None
+    assert redis('TTL', 'key') == -2
+
+
+def test_collections(redis):
+    assert redis('HSET', 'hash', 'a', 1, 'b', 2) == 2
+    assert redis('HGETALL', 'hash') == [b'a', b'1', b'b', b'2']
+    assert redis('RPUSH', 'list', 'a', 'b') == 2
+    assert redis('LPUSH', 'list', 'c') == 3
+    assert redis('LRANGE', 'list', 0, -1) == [b'c', b'a', b'b']
+    assert redis('LRANGE', 'list', 0, -5) == []
+    assert redis('SADD', 'set', 'a', 'a', 'b') == 2
+    assert redis('SMEMBERS', 'set') == [b'a', b'b']
+    assert redis('GET', 'hash').startswith('WRONGTYPE')
+    assert redis('KEYS', '*s*') == [b'hash', b'list', b'set']
+
+
+def test_transaction_and_databases(redis):
+    assert redis('MULTI') == 'OK'
+    assert redis('SET', 'key', 'value') == 'QUEUED'
+    assert redis('INCR', 'counter') == 'QUEUED'
+    assert redis('EXEC') == ['OK', 1]
+    assert redis('SELECT', 1) == 'OK'
+    assert redis('GET', 'key') is None
+    assert redis('DBSIZE') == 0
+    assert redis('NOSUCHCOMMAND').startswith('ERR unknown command')
+
+
+def test_reset():
+    with FakeRedis(port=6390) as server:
+        client = Client(server.address)
+        client('SET', 'key', 'value')
+        server.reset()
+        assert client('GET', 'key') is None
+        client.close()
+
+
+def test_in_process_allowed_by_blocker():
+    with NetworkBlocker(allowed_modules=[__name__ + '.Client.*']):
+        with FakeRedis(port=6390) as server:
+            client = Client(server.address)
+            assert client('PING') == 'PONG'
+            assert client.sock.getpeername()[1] == 6390
+            client.close()
+
+        with raises(NetworkBlockException):
+            socket.socket()
+
+
+def test_arguments(redis):
+    assert redis('GET').startswith('ERR wrong number of arguments')
+    assert redis('GET', 'a', 'b').startswith('ERR wrong number')
+    assert redis('DEL').startswith('ERR wrong number')
+    assert redis('MSET', 'a').startswith('ERR wrong number')
+    assert redis('HSET', 'hash', 'a', 1, 'b').startswith('ERR wrong number')
+    redis.sock.sendall(b'*0\r\n\r\n')
+    assert redis('PING') == 'PONG'
+
+
+def test_handler_errors_are_not_hidden():
+
+    class BrokenRedis(FakeRedis):
+
+        def _cmd_broken(self, connection):
+            raise TypeError('bug')
+
+    with BrokenRedis(port=6390) as server:
+        client = Client(server.address)
+        with raises(TypeError):
+            client('BROKEN')
+        client.close()
+
+
+def test_hello(redis):
+    assert redis('HELLO', 4).startswith('NOPROTO')
+    assert dict(zip(*[iter(redis('HELLO', 2))] * 2))[b'proto'] == 2
+
+
+@mark.parametrize('protocol', [None, 2, 3])
+def test_redis_py(protocol):
+    redis_py = importorskip('redis')
+    kwargs = {} if protocol is None else {'protocol': protocol}
+    with FakeRedis(port=6390):
+        client = redis_py.Redis(port=6390, **kwargs)
+        assert client.ping()
+        assert client.set('key', 'value')
+        assert client.get('key') == b'value'
+        client.hset('hash', mapping={'a': 1, 'b': 2})
+        assert client.hgetall('hash') == {b'a': b'1', b'b': b'2'}
+        client.sadd('set', 'a', 'b')
+        assert client.smembers('set') == {b'a', b'b'}
+        assert client.get('missing') is None
+        with client.pipeline() as pipeline:
+            assert pipeline.incr('counter').incr('counter').execute() == [
+                1, 2
+            ]
+        client.close()
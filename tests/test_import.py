@@ -0,0 +1,80 @@
+import json
+import subprocess
+import sys
+from pytest import fail
+
+import networktest
+import networktest.mock
+
+
+HEAVY_MODULES = (
+    'unittest', 'unittest.mock', 'http.client', 'json', 're', 'traceback',
+)
+
+
+def imported_modules(statement, setup=''):
+    """
+        Returns modules newly imported by statement in a fresh interpreter.
+    """
+    code = (
+        'import sys, json\n'
+        '%s\n'
+        'before = set(sys.modules)\n'
+        '%s\n'
+        'print(json.dumps(sorted(set(sys.modules) - before)))\n'
+    ) % (setup, statement)
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return set(json.loads(output))
+
+
+def test_package_import_is_lazy():
+    modules = imported_modules('import networktest, networktest.mock')
+    assert modules == {'networktest', 'networktest._lazy', 'networktest.mock'}
+
+
+def test_blocker_does_not_import_pytest():
+    modules = imported_modules('import networktest.blocker')
+    assert 'pytest' not in modules
+
+
+def test_api_mock_does_not_import_multiprocessing():
+    # Only shared mocks need it
+    modules = imported_modules('import networktest.mock.api')
+    assert 'networktest.mock.shared' not in modules
+    assert 'multiprocessing.connection' not in modules
+
+
+def test_plugin_import_is_lazy():
+    # pytest is always loaded by the time the plugin is
+    modules = imported_modules(
+        'import networktest.pytest.plugin', setup='import pytest'
+    )
+    assert 'networktest.blocker' not in modules
+    assert not modules.intersection(HEAVY_MODULES)
+
+
+def test_plugin_import_time_budget():
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         'import pytest\nimport networktest.pytest.plugin'],
+        stderr=subprocess.PIPE,
+        check=True
+    ).stderr.decode()
+    cumulative = {
+        line.split('|')[2].strip(): int(line.split('|')[1])
+        for line in output.splitlines()[1:]
+    }
+    # Microseconds. Generous enough to be stable on slow machines while
+    #   still catching anything that pulls in a heavy dependency.
+    assert cumulative['networktest.pytest.plugin'] < 20000
+
+
+def test_lazy_attributes():
+    assert networktest.NetworkBlocker.__name__ == 'NetworkBlocker'
+    assert networktest.mock.HttpApiMock.__name__ == 'HttpApiMock'
+    assert 'NetworkLimitedTest' in dir(networktest)
+    try:
+        networktest.DoesNotExist
+        fail('Should raise AttributeError')
+    except AttributeError:
+        pass
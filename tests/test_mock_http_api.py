@@ -1,10 +1,19 @@
+import json
+import threading
 import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import urllib.error
-from pytest import fail
+from pytest import fail, raises
 import requests
 
 from networktest import NetworkBlocker, NetworkBlockException
-from networktest.mock import HttpApiMock, HttpApiMockEndpoint, HttpApiMockResponse
+from networktest.mock import (
+    HttpApiMock,
+    HttpApiMockEndpoint,
+    HttpApiMockResource,
+    HttpApiMockResponse,
+    HttpApiMockSession
+)
 
 
 class TestMock(HttpApiMock):
@@ -26,6 +35,14 @@ class TestMock(HttpApiMock):
             match_pattern=b'^GET /test_raw_str/(?P<test_id>.*?)/',
             response=lambda groups: HttpApiMockResponse(f"HTTP/1.1 418 I'm a teapot\n\n{groups['test_id']}")
         ),
+        HttpApiMockEndpoint(
+            operation_id='test_headers',
+            match_pattern=b'^GET /test_headers/',
+            response=lambda groups: (200, {}, {
+                'Content-Type': 'application/vnd.test+json',
+                'X-Test': 'test',
+            })
+        ),
         HttpApiMockEndpoint(
             operation_id='test_raw_bytes',
             match_pattern=b'^GET /test_raw_bytes/(?P<test_id>.*?)/',
@@ -169,3 +186,210 @@ def test_request_matched_endpoint_raw_bytes():
         except urllib.error.HTTPError as e:
             assert e.code == 418
             assert e.read() == b'test'
+
+
+class ResourceMock(HttpApiMock):
+
+    hostnames = [
+        '127.0.0.1'
+    ]
+
+    resources = [
+        HttpApiMockResource(
+            name='videos',
+            path='/videos/',
+            indexes=['status'],
+            page_size=2,
+            seed=[
+                {'id': 1, 'status': 'ready'},
+                {'id': 2, 'status': 'failed'},
+                {'id': 3, 'status': 'ready'},
+            ]
+        )
+    ]
+
+
+def request_json(method, path, body=None):
+    if body is not None:
+        body = json.dumps(body).encode()
+    request = urllib.request.Request(
+        'http://127.0.0.1' + path, data=body, method=method
+    )
+    try:
+        with NetworkBlocker():
+            response = urllib.request.urlopen(request, timeout=0)
+        code, content = response.getcode(), response.read()
+    except urllib.error.HTTPError as e:
+        code, content = e.code, e.read()
+    return code, json.loads(content) if content else None
+
+
+def test_resource_list():
+    with ResourceMock() as mock_api:
+        code, page = request_json('GET', '/videos/')
+        assert code == 200
+        assert [video['id'] for video in page['results']] == [1, 2]
+
+        code, page = request_json(
+            'GET', '/videos/?cursor=%s' % page['next_cursor']
+        )
+        assert [video['id'] for video in page['results']] == [3]
+        assert page['next_cursor'] is None
+
+        code, page = request_json('GET', '/videos/?status=ready&offset=1')
+        assert [video['id'] for video in page['results']] == [3]
+        assert mock_api.list_videos.request_mock.call_count == 3
+
+        for query in ('offset=-2', 'limit=-1', 'limit=0', 'offset=a'):
+            code, page = request_json('GET', '/videos/?' + query)
+            assert code == 400
+            assert 'error' in page
+
+
+def test_resource_isolation():
+    with ResourceMock() as mock_api:
+        mock_api.videos.get(1)['status'] = 'mutated'
+        mock_api.videos.list()[0][0]['status'] = 'mutated'
+        assert mock_api.videos.get(1)['status'] != 'mutated'
+    with ResourceMock() as mock_api:
+        code, video = request_json('GET', '/videos/1/')
+        assert video['status'] != 'mutated'
+
+
+def test_resource_crud():
+    with ResourceMock() as mock_api:
+        code, video = request_json('POST', '/videos/', {'status': 'new'})
+        assert code == 201
+        assert video == {'id': 4, 'status': 'new'}
+        assert mock_api.videos.get(video['id']) == video
+
+        code, updated = request_json(
+            'PATCH', '/videos/%s/' % video['id'], {'status': 'ready'}
+        )
+        assert code == 200
+        assert updated['status'] == 'ready'
+
+        code, fetched = request_json('GET', '/videos/%s/' % video['id'])
+        assert fetched == updated
+
+        code, _ = request_json('DELETE', '/videos/%s/' % video['id'])
+        assert code == 204
+        code, _ = request_json('GET', '/videos/%s/' % video['id'])
+        assert code == 404
+
+        code, _ = request_json('POST', '/videos/', ['not', 'an', 'object'])
+        assert code == 400
+
+
+def test_resource_state_is_per_mock():
+    with ResourceMock() as mock_api:
+        mock_api.videos.delete(1)
+        assert len(mock_api.videos) == 2
+
+    with ResourceMock() as mock_api:
+        assert len(mock_api.videos) == 3
+
+
+def test_response_framing():
+    mock = TestMock()
+    with mock:
+        with NetworkBlocker():
+            response = urllib.request.urlopen(
+                'http://127.0.0.1/test_headers/', timeout=0
+            )
+            assert response.read() == b'{}'
+        assert response.headers['Content-Length'] == '2'
+        assert response.headers['Content-Type'] == 'application/vnd.test+json'
+        assert response.headers['X-Test'] == 'test'
+        # urllib always asks for the connection to be closed
+        assert response.headers['Connection'] == 'close'
+
+
+def test_connection_reuse():
+    mock = TestMock()
+    with mock:
+        with NetworkBlocker():
+            with requests.Session() as session:
+                for _ in range(3):
+                    response = session.get('http://127.0.0.1/test/abc/')
+                    assert response.headers['Connection'] == 'keep-alive'
+                    assert response.content == b'{"id": "abc"}'
+        connections = {call[0][0] for call in mock.send_mock.call_args_list}
+        assert len(connections) == 1
+
+
+class RealHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'real'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_connection_reuse_after_exit():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RealHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = 'http://127.0.0.1:%d/test/abc/' % server.server_port
+    try:
+        with requests.Session() as session:
+            with TestMock():
+                assert session.get(url).status_code == 418
+            # The pooled connection must reach the real server
+            response = session.get(url, timeout=5)
+            assert response.status_code == 200
+            assert response.content == b'real'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_connection_no_keep_alive():
+    mock = TestMock()
+    mock.keep_alive = False
+    with mock:
+        with NetworkBlocker():
+            with requests.Session() as session:
+                for _ in range(3):
+                    response = session.get('http://127.0.0.1/test/abc/')
+                    assert response.headers['Connection'] == 'close'
+                    connection = mock.send_mock.call_args[0][0]
+                    assert connection.sock is None
+        assert mock.send_mock.call_count == 3
+
+
+def test_endpoints_compiled_once():
+    first, second = TestMock(), TestMock()
+    assert first.endpoints[0] is not TestMock.endpoints[0]
+    assert first.endpoints[0]._compile() is first.endpoints[0]
+    assert first.endpoints[0]._HttpApiMockEndpoint__pattern is \
+        second.endpoints[0]._HttpApiMockEndpoint__pattern
+    assert first.endpoints[-1]._HttpApiMockEndpoint__pattern is \
+        second.endpoints[-1]._HttpApiMockEndpoint__pattern
+
+
+def test_reset():
+    session = HttpApiMockSession()
+    mock_api = session.enter(ResourceMock)
+    mock_api.get_videos.response = lambda groups: (500, None)
+    assert request_json('GET', '/videos/1/')[0] == 500
+    mock_api.videos.delete(1)
+    assert mock_api.get_videos.calls == [{'id': '1'}]
+
+    assert session.enter(ResourceMock) is not mock_api
+    assert session.get(ResourceMock).endpoints[0].calls == []
+    assert request_json('GET', '/videos/1/') == (
+        200, {'id': 1, 'status': 'ready'}
+    )
+    mock_api = session.enter(ResourceMock)
+    assert mock_api.get_videos.request_mock.call_count == 0
+    session.close()
+    with raises(NetworkBlockException):
+        request_json('GET', '/videos/1/')
@@ -0,0 +1,103 @@
+import threading
+from http.client import HTTPConnection
+import urllib.request
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from networktest.mock import HttpApiMock, HttpApiMockEndpoint
+from networktest.mock.latency import LatencyHistogram, LatencyRecorder
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        body = b'test'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class WatchMock(HttpApiMock):
+
+    hostnames = [
+        '127.0.0.1'
+    ]
+
+    endpoints = [
+        HttpApiMockEndpoint(
+            operation_id='test',
+            match_pattern=b'^GET /test/',
+            response=lambda groups: (204, None)
+        )
+    ]
+
+
+def test_histogram():
+    histogram = LatencyHistogram()
+    for milliseconds in range(1, 1001):
+        histogram.record(milliseconds / 1000)
+    assert histogram.count == 1000
+    assert histogram.min == 0.001
+    assert histogram.max == 1.0
+    assert abs(histogram.percentile(50) - 0.5) < 0.5 * 0.01
+    assert abs(histogram.percentile(99) - 0.99) < 0.99 * 0.01
+    assert histogram.percentile(100) <= histogram.max
+
+    other = LatencyHistogram()
+    other.record(2.0)
+    histogram.merge(other)
+    assert histogram.count == 1001
+    assert histogram.max == 2.0
+    assert histogram.to_dict()['count'] == 1001
+
+
+def test_watch_latency():
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        recorder = LatencyRecorder()
+        mock = WatchMock(mode=WatchMock.Modes.WATCH)
+        mock.latency_recorder = recorder
+        url = 'http://127.0.0.1:%d' % server.server_port
+        with mock:
+            for path in ('/test/', '/test/', '/other/'):
+                response = urllib.request.urlopen(url + path, timeout=5)
+                assert response.read() == b'test'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert recorder.get('127.0.0.1', 'test', 'headers').count == 2
+    assert recorder.get('127.0.0.1', 'test', 'body').count == 2
+    assert recorder.get('127.0.0.1', '*', 'body').count == 1
+    report = recorder.to_dict()
+    assert report['127.0.0.1']['test']['body']['max'] >= \
+        report['127.0.0.1']['test']['headers']['min']
+
+
+def test_watch_connection_reuse_after_exit():
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    connection = HTTPConnection('127.0.0.1', server.server_port, timeout=5)
+    try:
+        recorder = LatencyRecorder()
+        mock = WatchMock(mode=WatchMock.Modes.WATCH)
+        mock.latency_recorder = recorder
+        for _ in range(2):
+            with mock:
+                connection.request('GET', '/test/')
+                assert connection.getresponse().read() == b'test'
+            connection.request('GET', '/test/')
+            assert connection.getresponse().read() == b'test'
+    finally:
+        connection.close()
+        server.shutdown()
+        server.server_close()
+
+    assert recorder.get('127.0.0.1', 'test', 'headers').count == 2
+    assert recorder.get('127.0.0.1', 'test', 'body').count == 2
@@ -0,0 +1,156 @@
+import multiprocessing
+import urllib.request
+import urllib.error
+from concurrent.futures import ProcessPoolExecutor
+
+from networktest import NetworkBlocker, NetworkBlockException
+from pytest import raises
+
+from networktest.mock import (
+    HttpApiMock,
+    HttpApiMockEndpoint,
+    HttpApiMockResource
+)
+from networktest.mock.shared import SharedMockClient, SharedMockServer
+
+
+class SharedMock(HttpApiMock):
+
+    hostnames = [
+        '127.0.0.1'
+    ]
+
+    endpoints = [
+        HttpApiMockEndpoint(
+            operation_id='test',
+            match_pattern=b'^GET /test/(?P<test_id>.*?)/',
+            response=lambda groups: (418, {
+                'id': groups['test_id'],
+            })
+        ),
+        HttpApiMockEndpoint(
+            operation_id='broken',
+            match_pattern=b'^GET /broken/',
+            response=lambda groups: 1 / 0
+        )
+    ]
+
+    resources = [
+        HttpApiMockResource(name='items', path='/items/')
+    ]
+
+
+REQUEST = b'GET /test/1/ HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n'
+
+
+def fork_pool():
+    return ProcessPoolExecutor(
+        max_workers=2,
+        mp_context=multiprocessing.get_context('fork')
+    )
+
+
+def fetch(test_id):
+    try:
+        with NetworkBlocker():
+            urllib.request.urlopen(
+                'http://127.0.0.1/test/%s/' % test_id, timeout=0
+            ).read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def create_item(name):
+    request = urllib.request.Request(
+        'http://127.0.0.1/items/',
+        data=('{"name": "%s"}' % name).encode(),
+        method='POST'
+    )
+    with NetworkBlocker():
+        return urllib.request.urlopen(request, timeout=0).getcode()
+
+
+def fetch_broken(test_id):
+    try:
+        with NetworkBlocker():
+            urllib.request.urlopen('http://127.0.0.1/broken/', timeout=0)
+    except ZeroDivisionError:
+        pass
+    return fetch(test_id)
+
+
+def watch(test_id):
+    try:
+        with NetworkBlocker():
+            urllib.request.urlopen(
+                'http://127.0.0.1/test/%s/' % test_id, timeout=0
+            ).read()
+    except NetworkBlockException:
+        return True
+
+
+def test_shared_mock():
+    with SharedMock(shared=True) as mock_api:
+        with fork_pool() as pool:
+            results = list(pool.map(fetch, range(4)))
+        assert results == [
+            (418, ('{"id": "%s"}' % i).encode()) for i in range(4)
+        ]
+        assert mock_api.test.request_mock.call_count == 4
+        assert sorted(
+            call[0][0]['test_id']
+            for call in mock_api.test.request_mock.call_args_list
+        ) == ['0', '1', '2', '3']
+
+
+def test_shared_mock_error():
+    with SharedMock(shared=True) as mock_api:
+        with fork_pool() as pool:
+            results = list(pool.map(fetch_broken, range(4)))
+        assert [code for code, _ in results] == [418] * 4
+        assert len(mock_api.broken.calls) == 4
+
+
+def test_shared_mock_unknown_token():
+    mock = SharedMock()
+    server, token = SharedMockServer.register(mock)
+    try:
+        client = SharedMockClient.connect(server)
+        with raises(RuntimeError):
+            client.request(token + 1, REQUEST)
+        assert SharedMockClient.connect(server) is client
+        assert client.request(token, REQUEST).startswith(b'HTTP/1.1 418')
+
+        # eg. the connection was closed by the parent
+        client._SharedMockClient__connection.close()
+        with raises(OSError):
+            client.request(token, REQUEST)
+        assert client.closed
+        client = SharedMockClient.connect(server)
+        assert client.request(token, REQUEST).startswith(b'HTTP/1.1 418')
+    finally:
+        server.unregister(token)
+
+
+def test_shared_mock_resources():
+    with SharedMock(shared=True) as mock_api:
+        with fork_pool() as pool:
+            codes = list(pool.map(create_item, ['a', 'b', 'c']))
+        assert codes == [201, 201, 201]
+        assert sorted(item['name'] for item in mock_api.items) == [
+            'a', 'b', 'c'
+        ]
+
+
+def test_shared_mock_watch():
+    with SharedMock(mode=SharedMock.Modes.WATCH, shared=True) as mock_api:
+        with fork_pool() as pool:
+            assert all(pool.map(watch, range(3)))
+        assert mock_api.test.request_mock.call_count == 3
+
+
+def test_unshared_mock():
+    with SharedMock() as mock_api:
+        with fork_pool() as pool:
+            list(pool.map(fetch, range(2)))
+        mock_api.test.request_mock.assert_not_called()
@@ -0,0 +1,136 @@
+import random
+from pytest import raises
+
+from networktest.mock import ResourceStore
+
+
+def make_store(size=10):
+    store = ResourceStore(indexes=['color'])
+    store.seed(
+        {'color': 'red' if i % 2 else 'blue', 'size': i % 3}
+        for i in range(size)
+    )
+    return store
+
+
+def test_create_assigns_ids():
+    store = ResourceStore()
+    assert store.create({'name': 'a'}) == {'id': 1, 'name': 'a'}
+    assert store.create({'id': 'b', 'name': 'b'})['id'] == 'b'
+    assert len(store) == 2
+    assert store.get(1) == {'id': 1, 'name': 'a'}
+
+
+def test_update_and_delete():
+    store = make_store()
+    seeded = store.get(2)
+    updated = store.update(2, {'color': 'blue'})
+    assert updated['color'] == 'blue'
+    assert seeded['color'] == 'red'
+    assert store.get(2) == updated
+    assert 2 in [r['id'] for r in store.list({'color': 'blue'})[0]]
+
+    assert store.delete(2) == updated
+    assert store.get(2) is None
+    assert store.delete(2) is None
+    assert 2 not in [r['id'] for r in store.list({'color': 'blue'})[0]]
+
+
+def test_list_offset():
+    store = make_store()
+    results, cursor = store.list(offset=2, limit=3)
+    assert [r['id'] for r in results] == [3, 4, 5]
+    assert cursor is not None
+
+    results, cursor = store.list({'color': 'red'}, offset=1, limit=10)
+    assert [r['id'] for r in results] == [4, 6, 8, 10]
+    assert cursor is None
+
+
+def test_list_cursor():
+    store = make_store()
+    ids = []
+    cursor = None
+    while True:
+        results, cursor = store.list(
+            {'color': 'red', 'size': 1}, limit=1, cursor=cursor
+        )
+        ids.extend(r['id'] for r in results)
+        if cursor is None:
+            break
+    assert ids == [
+        r['id'] for r in store if r['color'] == 'red' and r['size'] == 1
+    ]
+
+
+def test_list_large_store():
+    store = make_store(100000)
+    results, cursor = store.list({'color': 'red'}, limit=5, offset=40000)
+    assert [r['id'] for r in results] == [80002, 80004, 80006, 80008, 80010]
+    results, cursor = store.list({'color': 'red'}, limit=5, cursor=cursor)
+    assert results[0]['id'] == 80012
+
+
+def test_resources_are_copied():
+    store = ResourceStore()
+    resource = {'name': 'a', 'tags': ['x']}
+    store.create(resource)
+    resource['tags'].append('y')
+    store.get(1)['name'] = 'b'
+    store.list()[0][0]['tags'].append('z')
+    store.update(1, {})['name'] = 'c'
+    assert store.get(1) == {'id': 1, 'name': 'a', 'tags': ['x']}
+
+    copy = store.copy()
+    copy.get(1)['tags'].append('y')
+    assert store.get(1)['tags'] == ['x']
+    assert copy.get(1)['tags'] == ['x']
+
+
+def test_list_rejects_invalid_pages():
+    store = make_store()
+    with raises(ValueError):
+        store.list(offset=-2, limit=5)
+    with raises(ValueError):
+        store.list(limit=-1)
+    with raises(ValueError):
+        store.list(limit=0, cursor='3')
+    with raises(ValueError):
+        store.list(cursor='abc')
+
+
+def test_copies_are_independent():
+    rng = random.Random(0)
+    stores = [make_store(20)]
+    models = [{r['id']: r for r in stores[0]}]
+    for _ in range(500):
+        i = rng.randrange(len(stores))
+        store, model = stores[i], models[i]
+        action = rng.random()
+        resource_id = rng.randrange(1, 40)
+        if action < 0.1 and len(stores) < 8:
+            stores.append(store.copy())
+            models.append(dict(model))
+        elif action < 0.15 and i > 0:
+            store.reset()
+            models[i] = {r['id']: r for r in store._ResourceStore__baseline}
+        elif action < 0.4 and resource_id not in model:
+            model[resource_id] = store.create({
+                'id': resource_id, 'color': rng.choice(['red', 'blue'])
+            })
+        elif action < 0.7:
+            updated = store.update(
+                resource_id, {'color': rng.choice(['red', 'blue', 'green'])}
+            )
+            if updated is not None:
+                model[resource_id] = updated
+        else:
+            store.delete(resource_id)
+            model.pop(resource_id, None)
+
+        for store, model in zip(stores, models):
+            assert {r['id']: r for r in store} == model
+            assert [r['id'] for r in store.list()[0]] == list(model)
+            for color in ('red', 'blue', 'green'):
+                assert [r['id'] for r in store.list({'color': color})[0]] \
+                    == [r['id'] for r in store if r['color'] == color]
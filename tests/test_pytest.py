@@ -1,7 +1,9 @@
 import socket
-from pytest import fail, mark
+import sys
+from pytest import fail, fixture, importorskip, mark
 
 from networktest import NetworkBlockException
+from networktest.pytest.cache import NetworkCache
 
 
 def send():
@@ -9,6 +11,19 @@ def send():
     sock.sendto(b'test', ('127.0.0.1', 80))
 
 
+@fixture
+def stub_redis(pytester, monkeypatch):
+    """
+        Returns a directory for a stub redis package, which is allowed by
+          networklimited, hiding any installed redis from tests run in
+          process.
+    """
+    for name in list(sys.modules):
+        if name == 'redis' or name.startswith('redis.'):
+            monkeypatch.delitem(sys.modules, name)
+    return pytester.mkpydir('redis')
+
+
 @mark.networkblocked
 def test_strict_marker():
     try:
@@ -25,3 +40,230 @@ def test_limited_marker():
         fail('Should fail')
     except NetworkBlockException:
         pass
+
+
+def test_network_budget(pytester, stub_redis):
+    stub_redis.joinpath('client.py').write_text(
+        'import socket\n'
+        '\n'
+        '\n'
+        'def connect():\n'
+        '    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)\n'
+        '    sock.connect(("127.0.0.1", 9))\n'
+        '    sock.sendto(b"test", ("127.0.0.1", 9))\n'
+        '    sock.close()\n'
+    )
+    pytester.makepyfile(
+        'from pytest import mark\n'
+        'from redis import client\n'
+        '\n'
+        '\n'
+        '@mark.networklimited(max_connections=1)\n'
+        'def test_within_budget():\n'
+        '    client.connect()\n'
+        '\n'
+        '\n'
+        '@mark.networklimited(max_connections=1, max_bytes_sent=4)\n'
+        'def test_over_budget():\n'
+        '    client.connect()\n'
+        '    client.connect()\n'
+    )
+    result = pytester.runpytest('--network-usage')
+    result.assert_outcomes(passed=1, failed=1)
+    result.stdout.fnmatch_lines([
+        '*Network budget exceeded: connections 2 > 1, bytes_sent 8 > 4*',
+        '*network usage (worst offenders)*',
+        '*2 connections*8 sent*test_over_budget*',
+    ])
+
+
+def test_http_api_mock_fixture(pytester):
+    pytester.makepyfile(
+        'import urllib.request\n'
+        'from networktest.mock import HttpApiMock, HttpApiMockEndpoint\n'
+        '\n'
+        '\n'
+        'class ApiMock(HttpApiMock):\n'
+        '    hostnames = ["127.0.0.1"]\n'
+        '    endpoints = [HttpApiMockEndpoint(\n'
+        '        "test", b"^GET /test/", lambda groups: (200, {})\n'
+        '    )]\n'
+        '\n'
+        '\n'
+        'mocks = []\n'
+        '\n'
+        '\n'
+        'def test_first(http_api_mock, http_api_mock_session):\n'
+        '    mock_api = http_api_mock(ApiMock)\n'
+        '    urllib.request.urlopen("http://127.0.0.1/test/").read()\n'
+        '    assert len(mock_api.test.calls) == 1\n'
+        '    mocks.append(http_api_mock_session.get(ApiMock))\n'
+        '\n'
+        '\n'
+        'def test_second(http_api_mock, http_api_mock_session):\n'
+        '    mock_api = http_api_mock(ApiMock)\n'
+        '    assert mock_api.test.calls == []\n'
+        '    assert http_api_mock_session.get(ApiMock) is mocks[0]\n'
+    )
+    result = pytester.runpytest()
+    result.assert_outcomes(passed=2)
+
+
+def test_fake_redis_fixture(pytester, stub_redis):
+    stub_redis.joinpath('client.py').write_text(
+        'import socket\n'
+        '\n'
+        '\n'
+        'def ping(address=("localhost", 6379)):\n'
+        '    sock = socket.create_connection(address, timeout=1)\n'
+        '    sock.sendall(b"*2\\r\\n$4\\r\\nINCR\\r\\n$3\\r\\nkey\\r\\n")\n'
+        '    response = sock.recv(64)\n'
+        '    sock.close()\n'
+        '    return response\n'
+    )
+    pytester.makepyfile(
+        'import socket\n'
+        'from pytest import mark\n'
+        'from redis import client\n'
+        '\n'
+        'original_socket = socket.socket\n'
+        '\n'
+        '\n'
+        '@mark.networklimited\n'
+        'def test_in_process(fake_redis):\n'
+        '    assert client.ping() == b":1\\r\\n"\n'
+        '\n'
+        '\n'
+        '@mark.networklimited\n'
+        'def test_reset(fake_redis):\n'
+        '    assert client.ping() == b":1\\r\\n"\n'
+        '\n'
+        '\n'
+        '@mark.networklimited\n'
+        '@mark.fake_redis(transport="loopback", port=None)\n'
+        'def test_loopback(fake_redis):\n'
+        '    assert client.ping(fake_redis.address) == b":1\\r\\n"\n'
+        '\n'
+        '\n'
+        'def test_restored():\n'
+        '    assert socket.socket is original_socket\n'
+    )
+    result = pytester.runpytest()
+    result.assert_outcomes(passed=4)
+
+
+def test_network_cache(pytester):
+    pytester.makeconftest(
+        'import pytest\n'
+        '\n'
+        '\n'
+        '@pytest.hookimpl(trylast=True)\n'
+        'def pytest_collection_modifyitems(items):\n'
+        '    for item in items:\n'
+        '        mark = item.get_closest_marker("xdist_group")\n'
+        '        if mark is not None:\n'
+        '            print("group", item.name, mark.args[0])\n'
+    )
+    pytester.makepyfile(
+        'import socket\n'
+        'import urllib.request\n'
+        'from pytest import mark, raises\n'
+        'from networktest import NetworkBlockException\n'
+        'from networktest.mock import HttpApiMock\n'
+        '\n'
+        '\n'
+        'class ApiMock(HttpApiMock):\n'
+        '    hostnames = ["127.0.0.1"]\n'
+        '\n'
+        '\n'
+        'def test_offline():\n'
+        '    pass\n'
+        '\n'
+        '\n'
+        '@mark.networkblocked\n'
+        'def test_blocked():\n'
+        '    with raises(NetworkBlockException):\n'
+        '        socket.socket()\n'
+        '\n'
+        '\n'
+        'def test_mocked():\n'
+        '    with ApiMock():\n'
+        '        urllib.request.urlopen("http://127.0.0.1/").read()\n'
+    )
+    result = pytester.runpytest('--network-new')
+    result.assert_outcomes(passed=3)
+    result.stdout.fnmatch_lines([
+        '*newly networked tests*',
+        '*::test_blocked',
+        '*::test_mocked',
+    ])
+    cached = pytester.runpytest('--cache-show', 'networktest/*')
+    cached.stdout.fnmatch_lines(["*'blocked': 1*", "*'127.0.0.1'*"])
+
+    result = pytester.runpytest('--network-new', '--network-only', '-s')
+    result.assert_outcomes(passed=2, deselected=1)
+    result.stdout.no_fnmatch_line('*newly networked tests*')
+
+    result = pytester.runpytest('--network-groups=2', '-s')
+    result.stdout.fnmatch_lines_random([
+        'group test_blocked networktest-*',
+        'group test_mocked networktest-*',
+    ])
+    result.stdout.no_fnmatch_line('group test_offline*')
+
+
+def test_network_cache_xdist(pytester):
+    importorskip('xdist')
+    pytester.makepyfile(
+        'import socket\n'
+        'from pytest import mark, raises\n'
+        'from networktest import NetworkBlockException\n'
+        '\n'
+        '\n'
+        'def test_offline():\n'
+        '    pass\n'
+        '\n'
+        '\n'
+        '@mark.xdist_group("manual")\n'
+        'def test_manual():\n'
+        '    pass\n'
+        '\n'
+        '\n'
+        '@mark.networkblocked\n'
+        '@mark.parametrize("i", range(2))\n'
+        'def test_blocked(i):\n'
+        '    with raises(NetworkBlockException):\n'
+        '        socket.socket()\n'
+    )
+    pytester.runpytest().assert_outcomes(passed=4)
+
+    xdist = ('-p', 'xdist', '-n', '2', '--dist', 'loadgroup', '-v')
+    result = pytester.runpytest_subprocess(*xdist, '--network-groups=2')
+    result.assert_outcomes(passed=4)
+    result.stdout.fnmatch_lines_random([
+        '*::test_manual@manual*',
+        '*::test_blocked?0?@networktest-*',
+        '*::test_blocked?1?@networktest-*',
+    ])
+
+    # Grouped runs are cached under the original node ids
+    result = pytester.runpytest_subprocess(
+        *xdist, '--network-groups=2', '--network-only'
+    )
+    # Workers deselect, so the controller only sees the networked tests
+    result.assert_outcomes(passed=2)
+    cached = pytester.runpytest('--cache-show', 'networktest/*')
+    cached.stdout.no_fnmatch_line('*@networktest*')
+
+
+def test_network_cache_groups():
+    cache = NetworkCache(None)
+    cache.previous = {
+        'a': {'duration': 5.0},
+        'b': {'duration': 3.0},
+        'c': {'duration': 2.0},
+        'd': {'duration': 1.0},
+    }
+    assert cache.assign_groups(['a', 'b', 'c', 'd', 'e'], 2) == {
+        'a': 0, 'b': 1, 'c': 1, 'd': 0,
+    }